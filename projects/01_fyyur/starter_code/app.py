@@ -3,15 +3,22 @@
 #----------------------------------------------------------------------------#
 
 import json
+import functools
+from datetime import datetime
 import dateutil.parser
 import babel
+import babel.dates
 from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from markupsafe import Markup
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from fragments import Fragment, FragmentCache
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -27,6 +34,27 @@ db = SQLAlchemy(app)
 # Models.
 #----------------------------------------------------------------------------#
 
+# Genres are rows of their own, linked to venues and artists. Each link table's
+# primary key serves a venue's or artist's genres; the (genre_id, ...) index
+# serves the other direction, finding the venues or artists of a genre.
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -38,6 +66,7 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -49,28 +78,217 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+# A show is an artist playing a venue at start_time. Venue and artist pages
+# read a venue's or an artist's shows by time, so each side has a composite
+# (id, start_time) index: the lookup and the ordering are served by one index
+# range scan, and splitting past from upcoming is a cut at now within it.
+class Show(db.Model):
+    __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+
+    venue = db.relationship('Venue', backref=db.backref('shows', lazy=True))
+    artist = db.relationship('Artist', backref=db.backref('shows', lazy=True))
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+DATETIME_CACHE_SIZE = 4096
+
+# Pages list the same show times over and over (a venue's shows on its page,
+# on the artist pages and on /shows), so formatted values are memoized.
+# Strings are parsed with dateutil; datetimes are formatted as they are.
+# Aware datetimes that are equal across zones compare and hash alike, so
+# the memo is keyed on tzinfo as well.
+@functools.lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def _format_datetime(value, tzinfo, format, locale):
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  format = DATETIME_FORMATS.get(format, format)
+  return babel.dates.format_datetime(value, format, locale=locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  tzinfo = value.tzinfo if isinstance(value, datetime) else None
+  return _format_datetime(value, tzinfo, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+AREAS_PER_PAGE = 20
+
+# The venue or artist ids (member, a column of venue_genres or artist_genres)
+# linked to the genre called name, for an IN filter: the unique name finds the
+# genre and the (genre_id, ...) index its members, inside the caller's query.
+def genre_members(member, name):
+  return db.session.query(member) \
+    .join(Genre, Genre.id == member.table.c.genre_id) \
+    .filter(Genre.name == name) \
+    .subquery()
+
+# Every genre in use with the number of venues or artists it has, in one
+# grouped query over the link table, for the genre filter links.
+def genre_facets(links):
+  return db.session.query(Genre.name, db.func.count()) \
+    .join(links, links.c.genre_id == Genre.id) \
+    .group_by(Genre.id, Genre.name) \
+    .order_by(Genre.name) \
+    .all()
+
+# Venue directory: one page of (city, state) areas with their venues and the
+# number of upcoming shows at each, from a single query however many venues
+# there are. The page of areas is a subquery; shows are LEFT JOINed with the
+# start_time condition in the join, so venues without upcoming shows still
+# show up with 0. One area more than requested is fetched to tell whether
+# there is a next page. With a genre, only that genre's venues are listed.
+def venue_directory(page=1, per_page=AREAS_PER_PAGE, now=None, genre=None):
+  now = now or datetime.utcnow()
+  venues = db.session.query(Venue)
+  if genre:
+    venues = venues.filter(Venue.id.in_(genre_members(venue_genres.c.venue_id, genre)))
+  areas = venues.with_entities(Venue.city, Venue.state) \
+    .group_by(Venue.city, Venue.state) \
+    .order_by(Venue.state, Venue.city) \
+    .limit(per_page + 1).offset((page - 1) * per_page) \
+    .subquery()
+
+  rows = venues.with_entities(
+      Venue.city, Venue.state, Venue.id, Venue.name,
+      db.func.count(Show.id)) \
+    .join(areas, db.and_(Venue.city == areas.c.city,
+                         Venue.state == areas.c.state)) \
+    .outerjoin(Show, db.and_(Show.venue_id == Venue.id,
+                             Show.start_time > now)) \
+    .group_by(Venue.city, Venue.state, Venue.id, Venue.name) \
+    .order_by(Venue.state, Venue.city, Venue.name, Venue.id) \
+    .all()
+
+  data = []
+  for city, state, venue_id, name, num_upcoming_shows in rows:
+    if not data or (data[-1]['city'], data[-1]['state']) != (city, state):
+      data.append({'city': city, 'state': state, 'venues': []})
+    data[-1]['venues'].append({
+      'id': venue_id,
+      'name': name,
+      'num_upcoming_shows': num_upcoming_shows,
+    })
+
+  has_next = len(data) > per_page
+  return data[:per_page], has_next
+
+# Past and upcoming shows for a venue or artist page. All of the entity's
+# shows come back in one query, ordered by start_time through the composite
+# index and joined to the other side's name and image; they are split at now
+# here, upcoming soonest first and past most recent first.
+def _split_shows(rows, prefix, now):
+  past, upcoming = [], []
+  for start_time, other_id, name, image_link in rows:
+    (upcoming if start_time > now else past).append({
+      prefix + '_id': other_id,
+      prefix + '_name': name,
+      prefix + '_image_link': image_link,
+      'start_time': start_time,
+    })
+  past.reverse()
+  return {
+    'past_shows': past,
+    'upcoming_shows': upcoming,
+    'past_shows_count': len(past),
+    'upcoming_shows_count': len(upcoming),
+  }
+
+def venue_shows(venue_id, now=None):
+  rows = db.session.query(
+      Show.start_time, Artist.id, Artist.name, Artist.image_link) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.venue_id == venue_id) \
+    .order_by(Show.start_time) \
+    .all()
+  return _split_shows(rows, 'artist', now or datetime.utcnow())
+
+def artist_shows(artist_id, now=None):
+  rows = db.session.query(
+      Show.start_time, Venue.id, Venue.name, Venue.image_link) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .filter(Show.artist_id == artist_id) \
+    .order_by(Show.start_time) \
+    .all()
+  return _split_shows(rows, 'venue', now or datetime.utcnow())
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+# The body of the venue and artist pages is rendered once and served from
+# fragment_cache until the venue, artist or one of their shows changes.
+# Changes are collected from each flush and applied once the transaction
+# commits. A venue or artist page also lists the other side's names and
+# images, so editing the columns of a venue or deleting it drops every cached
+# artist page and vice versa; a new or changed show only drops its venue's and
+# artist's, even though it also marks both of them dirty through the backrefs.
+fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_BYTES'])
+
+def _touched(session, kind, entity_id=None):
+  session.info.setdefault('fragments', set()).add((kind, entity_id))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_fragment_changes(session, flush_context):
+  for obj in session.new | session.dirty | session.deleted:
+    if isinstance(obj, (Venue, Artist)):
+      kind, other = ('venue', 'artist') if isinstance(obj, Venue) else ('artist', 'venue')
+      if obj in session.deleted:
+        _touched(session, kind, obj.id)
+        _touched(session, other)
+      elif obj in session.new:
+        _touched(session, kind, obj.id)
+      elif session.is_modified(obj, include_collections=False):
+        _touched(session, kind, obj.id)
+        _touched(session, other)
+      elif session.is_modified(obj):
+        # genres, or shows, which the Show branch below already handles
+        _touched(session, kind, obj.id)
+    elif isinstance(obj, Show):
+      for kind, column in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        history = inspect(obj).attrs[column].history
+        for entity_id in history.sum():
+          _touched(session, kind, entity_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_fragments(session):
+  for kind, entity_id in session.info.pop('fragments', ()):
+    fragment_cache.touch(kind, entity_id)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_fragment_changes(session, previous_transaction):
+  session.info.pop('fragments', None)
+
+# A page stops being valid when its next upcoming show starts.
+def _render_fragment(template, title, upcoming_shows, **context):
+  expires = upcoming_shows[0]['start_time'] if upcoming_shows else None
+  return Fragment(title, Markup(render_template(template, **context)), expires)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -85,30 +303,12 @@ def index():
 
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data=[{
-    "city": "San Francisco",
-    "state": "CA",
-    "venues": [{
-      "id": 1,
-      "name": "The Musical Hop",
-      "num_upcoming_shows": 0,
-    }, {
-      "id": 3,
-      "name": "Park Square Live Music & Coffee",
-      "num_upcoming_shows": 1,
-    }]
-  }, {
-    "city": "New York",
-    "state": "NY",
-    "venues": [{
-      "id": 2,
-      "name": "The Dueling Pianos Bar",
-      "num_upcoming_shows": 0,
-    }]
-  }]
-  return render_template('pages/venues.html', areas=data);
+  page = max(request.args.get('page', 1, type=int), 1)
+  genre = request.args.get('genre')
+  data, has_next = venue_directory(page, genre=genre)
+  return render_template('pages/venues.html', areas=data, page=page,
+                         has_next=has_next, genre=genre,
+                         facets=genre_facets(venue_genres))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
@@ -128,86 +328,27 @@ def search_venues():
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  data1={
-    "id": 1,
-    "name": "The Musical Hop",
-    "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
-    "address": "1015 Folsom Street",
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "123-123-1234",
-    "website": "https://www.themusicalhop.com",
-    "facebook_link": "https://www.facebook.com/TheMusicalHop",
-    "seeking_talent": True,
-    "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-    "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-    "past_shows": [{
-      "artist_id": 4,
-      "artist_name": "Guns N Petals",
-      "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-      "start_time": "2019-05-21T21:30:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data2={
-    "id": 2,
-    "name": "The Dueling Pianos Bar",
-    "genres": ["Classical", "R&B", "Hip-Hop"],
-    "address": "335 Delancey Street",
-    "city": "New York",
-    "state": "NY",
-    "phone": "914-003-1132",
-    "website": "https://www.theduelingpianos.com",
-    "facebook_link": "https://www.facebook.com/theduelingpianos",
-    "seeking_talent": False,
-    "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80",
-    "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 0,
-  }
-  data3={
-    "id": 3,
-    "name": "Park Square Live Music & Coffee",
-    "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
-    "address": "34 Whiskey Moore Ave",
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "415-000-1234",
-    "website": "https://www.parksquarelivemusicandcoffee.com",
-    "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
-    "seeking_talent": False,
-    "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-    "past_shows": [{
-      "artist_id": 5,
-      "artist_name": "Matt Quevedo",
-      "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-      "start_time": "2019-06-15T23:00:00.000Z"
-    }],
-    "upcoming_shows": [{
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-01T20:00:00.000Z"
-    }, {
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-08T20:00:00.000Z"
-    }, {
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-15T20:00:00.000Z"
-    }],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 1,
+  fragment, key = fragment_cache.get('venue', venue_id)
+  if fragment is not None:
+    return render_template('pages/show_venue.html', fragment=fragment)
+
+  venue = Venue.query.get_or_404(venue_id)
+  data = {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": [genre.name for genre in venue.genres],
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "facebook_link": venue.facebook_link,
+    "image_link": venue.image_link,
   }
-  data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
-  return render_template('pages/show_venue.html', venue=data)
+  data.update(venue_shows(venue_id))
+  fragment = _render_fragment('fragments/venue.html', venue.name,
+                              data['upcoming_shows'], venue=data)
+  fragment_cache.put(key, fragment)
+  return render_template('pages/show_venue.html', fragment=fragment)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -242,18 +383,14 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data=[{
-    "id": 4,
-    "name": "Guns N Petals",
-  }, {
-    "id": 5,
-    "name": "Matt Quevedo",
-  }, {
-    "id": 6,
-    "name": "The Wild Sax Band",
-  }]
-  return render_template('pages/artists.html', artists=data)
+  genre = request.args.get('genre')
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = query.filter(Artist.id.in_(genre_members(artist_genres.c.artist_id, genre)))
+  data = [{'id': artist_id, 'name': name}
+          for artist_id, name in query.order_by(Artist.name, Artist.id)]
+  return render_template('pages/artists.html', artists=data, genre=genre,
+                         facets=genre_facets(artist_genres))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
@@ -273,80 +410,26 @@ def search_artists():
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  data1={
-    "id": 4,
-    "name": "Guns N Petals",
-    "genres": ["Rock n Roll"],
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "326-123-5000",
-    "website": "https://www.gunsnpetalsband.com",
-    "facebook_link": "https://www.facebook.com/GunsNPetals",
-    "seeking_venue": True,
-    "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
-    "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-    "past_shows": [{
-      "venue_id": 1,
-      "venue_name": "The Musical Hop",
-      "venue_image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-      "start_time": "2019-05-21T21:30:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data2={
-    "id": 5,
-    "name": "Matt Quevedo",
-    "genres": ["Jazz"],
-    "city": "New York",
-    "state": "NY",
-    "phone": "300-400-5000",
-    "facebook_link": "https://www.facebook.com/mattquevedo923251523",
-    "seeking_venue": False,
-    "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-    "past_shows": [{
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2019-06-15T23:00:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data3={
-    "id": 6,
-    "name": "The Wild Sax Band",
-    "genres": ["Jazz", "Classical"],
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "432-325-5432",
-    "seeking_venue": False,
-    "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-    "past_shows": [],
-    "upcoming_shows": [{
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-01T20:00:00.000Z"
-    }, {
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-08T20:00:00.000Z"
-    }, {
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-15T20:00:00.000Z"
-    }],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 3,
+  fragment, key = fragment_cache.get('artist', artist_id)
+  if fragment is not None:
+    return render_template('pages/show_artist.html', fragment=fragment)
+
+  artist = Artist.query.get_or_404(artist_id)
+  data = {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": [genre.name for genre in artist.genres],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "facebook_link": artist.facebook_link,
+    "image_link": artist.image_link,
   }
-  data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
-  return render_template('pages/show_artist.html', artist=data)
+  data.update(artist_shows(artist_id))
+  fragment = _render_fragment('fragments/artist.html', artist.name,
+                              data['upcoming_shows'], artist=data)
+  fragment_cache.put(key, fragment)
+  return render_template('pages/show_artist.html', fragment=fragment)
 
 #  Update
 #  ----------------------------------------------------------------
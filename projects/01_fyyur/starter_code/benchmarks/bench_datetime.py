@@ -0,0 +1,84 @@
+'''
+datetime filter micro-benchmark
+
+Formats the start times of a /shows page worth of rows with the filter as it
+was (dateutil.parser.parse and babel.dates.format_datetime on every call)
+and with format_datetime from app.py, given ISO strings and given datetimes.
+Rows draw their start time from a smaller set of distinct times, as show
+listings repeat the same slots; the memoized filter is also timed on
+distinct values only, with its cache cleared, to show that it is no faster
+than the old filter without memo hits: the gain comes from the memo.
+
+    python -m benchmarks.bench_datetime
+    python -m benchmarks.bench_datetime --rows 5000 --distinct 500
+'''
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def timed(label, formatter, values, rounds, before=None):
+  best = None
+  for _ in range(rounds):
+    if before is not None:
+      before()
+    started = time.perf_counter()
+    for value in values:
+      formatter(value, 'full')
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  print('{:28} {:>10.2f} {:>10.2f}'.format(
+    label, best * 1000, best * 1e6 / len(values)))
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('--rows', type=int, default=5000)
+  parser.add_argument('--distinct', type=int, default=500)
+  parser.add_argument('--rounds', type=int, default=5)
+  args = parser.parse_args()
+
+  from app import format_datetime, _format_datetime
+
+  generator = random.Random(0)
+  start = datetime(2035, 1, 1, 20, 0)
+  slots = [start + timedelta(hours=12 * number)
+           for number in range(args.distinct)]
+  times = [generator.choice(slots) for _ in range(args.rows)]
+  strings = [value.isoformat() + '.000Z' for value in times]
+
+  assert format_datetime(strings[0], 'full') == \
+    legacy_format_datetime(strings[0], 'full')
+
+  print('{} rows, {} distinct start times, best of {}'.format(
+    args.rows, args.distinct, args.rounds))
+  print('{:28} {:>10} {:>10}'.format('filter', 'page ms', 'us/row'))
+  legacy = timed('legacy, strings', legacy_format_datetime, strings,
+                 args.rounds)
+  cold = timed('no memo hits, distinct', format_datetime,
+               [slot.isoformat() for slot in slots], args.rounds,
+               before=_format_datetime.cache_clear)
+  _format_datetime.cache_clear()
+  timed('memoized, strings', format_datetime, strings, args.rounds)
+  memoized = timed('memoized, datetimes', format_datetime, times, args.rounds)
+  print('per value without memo hits: {:.2f}x the legacy time; '
+        'per page with datetimes: {:.0f}x faster'.format(
+          (cold / args.distinct) / (legacy / args.rows), legacy / memoized))
+
+
+if __name__ == '__main__':
+  main()
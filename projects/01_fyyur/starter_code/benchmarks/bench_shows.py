@@ -0,0 +1,134 @@
+'''
+Venue and artist page query benchmark
+
+Fills a database with venues, artists and a million shows spread over four
+years either side of now, then times venue_shows() and artist_shows() (the
+past/upcoming lists behind /venues/<id> and /artists/<id>) for random
+venues and artists, first with the composite (venue_id, start_time) and
+(artist_id, start_time) indexes and then without them. Reports p50/p99
+latency and the average number of shows per page for each.
+
+    python -m benchmarks.bench_shows
+    python -m benchmarks.bench_shows --shows 100000 --lookups 200
+    python -m benchmarks.bench_shows \
+        --database-url postgresql://localhost/fyyur_bench
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+CHUNK = 50000
+
+
+def fill(db, models, links, args):
+  Venue, Artist, Show = models
+  # only the tables filled here, plus the genre links that reference them;
+  # genres and anything else in the database are left alone
+  tables = [model.__table__ for model in models] + list(links)
+  db.Model.metadata.drop_all(bind=db.engine, tables=tables)
+  db.Model.metadata.create_all(bind=db.engine, tables=tables)
+  generator = random.Random(0)
+  now = datetime.utcnow()
+  span = int(timedelta(days=4 * 365).total_seconds())
+
+  with db.engine.begin() as connection:
+    connection.execute(Venue.__table__.insert(), [
+      {'name': 'Venue {}'.format(number), 'city': 'City', 'state': 'CA',
+       'image_link': 'https://example.com/venue/{}.jpg'.format(number)}
+      for number in range(args.venues)
+    ])
+    connection.execute(Artist.__table__.insert(), [
+      {'name': 'Artist {}'.format(number),
+       'image_link': 'https://example.com/artist/{}.jpg'.format(number)}
+      for number in range(args.artists)
+    ])
+    for start in range(0, args.shows, CHUNK):
+      connection.execute(Show.__table__.insert(), [
+        {'venue_id': generator.randint(1, args.venues),
+         'artist_id': generator.randint(1, args.artists),
+         'start_time': now + timedelta(
+           seconds=generator.randint(-span, span))}
+        for _ in range(start, min(start + CHUNK, args.shows))
+      ])
+
+
+def time_lookups(helper, count, lookups, seed):
+  generator = random.Random(seed)
+  timings = []
+  shows = 0
+  for _ in range(lookups):
+    started = time.perf_counter()
+    result = helper(generator.randint(1, count))
+    timings.append(time.perf_counter() - started)
+    shows += result['past_shows_count'] + result['upcoming_shows_count']
+  return sorted(timings), shows / lookups
+
+
+def percentile(timings, fraction):
+  index = max(0, int(round(fraction * len(timings))) - 1)
+  return timings[index] * 1000
+
+
+def report(label, helper_name, timings, shows):
+  print('{:12} {:14} {:>9.2f} {:>9.2f} {:>9.1f}'.format(
+    label, helper_name, percentile(timings, 0.50),
+    percentile(timings, 0.99), shows))
+
+
+def run(args):
+  # app reads DATABASE_URL from config.py when it is imported
+  import app as fyyur
+
+  models = (fyyur.Venue, fyyur.Artist, fyyur.Show)
+  links = (fyyur.venue_genres, fyyur.artist_genres)
+  with fyyur.app.app_context():
+    fyyur.Genre.__table__.create(fyyur.db.engine, checkfirst=True)
+    started = time.perf_counter()
+    fill(fyyur.db, models, links, args)
+    print('{} venues, {} artists, {} shows filled in {:.1f}s'.format(
+      args.venues, args.artists, args.shows, time.perf_counter() - started))
+    print('{:12} {:14} {:>9} {:>9} {:>9}'.format(
+      'indexes', 'helper', 'p50 ms', 'p99 ms', 'shows'))
+
+    helpers = (('venue_shows', fyyur.venue_shows, args.venues),
+               ('artist_shows', fyyur.artist_shows, args.artists))
+    for label in ('composite', 'none'):
+      if label == 'none':
+        for index in fyyur.Show.__table__.indexes:
+          index.drop(fyyur.db.engine)
+      for name, helper, count in helpers:
+        # one untimed pass warms the page cache
+        time_lookups(helper, count, min(args.lookups, 20), 1)
+        report(label, name, *time_lookups(helper, count, args.lookups, 2))
+        fyyur.db.session.remove()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('--database-url',
+                      help='benchmark this database instead of a temporary '
+                           'SQLite file; its Venue, Artist and Show tables '
+                           'and the venue_genres and artist_genres links '
+                           'are dropped and recreated (Genre is kept)')
+  parser.add_argument('--venues', type=int, default=5000)
+  parser.add_argument('--artists', type=int, default=20000)
+  parser.add_argument('--shows', type=int, default=1000000)
+  parser.add_argument('--lookups', type=int, default=500)
+  args = parser.parse_args()
+
+  if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+    run(args)
+    return
+
+  with tempfile.TemporaryDirectory() as directory:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+      directory, 'shows.db')
+    run(args)
+
+
+if __name__ == '__main__':
+  main()
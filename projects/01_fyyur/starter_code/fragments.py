@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+# A rendered piece of a page: its title, its html and, when what it shows
+# changes with time (an upcoming show becoming a past one), the utc datetime
+# it stops being valid at.
+Fragment = namedtuple('Fragment', ['title', 'html', 'expires'])
+
+
+def _size(fragment):
+    return len(fragment.html) + len(fragment.title or '')
+
+
+class FragmentCache:
+    '''Rendered fragments of the venue and artist pages.
+
+    Entries are keyed by (kind, id, revision). touch() bumps the revision of
+    an entity, or of every entity of a kind, so a changed venue or artist is
+    never served from a stale entry; the superseded entries are dropped at
+    the same time. get() returns the key alongside the fragment, and a page
+    rendered after a miss is stored under that key, so a page rendered from
+    data that changed while it was being rendered is never stored. The
+    cache holds at most max_bytes characters of html and
+    evicts the least recently used entries beyond that.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._revisions = {}
+        self._generations = {}
+
+    def _key(self, kind, entity_id):
+        return (kind, entity_id, self._generations.get(kind, 0),
+                self._revisions.get((kind, entity_id), 0))
+
+    def _drop(self, key):
+        self.bytes -= _size(self._entries.pop(key))
+
+    def get(self, kind, entity_id):
+        '''Returns (fragment, key); fragment is None on a miss, and key is
+        what put() should store the page rendered for it under.'''
+        with self._lock:
+            key = self._key(kind, entity_id)
+            fragment = self._entries.get(key)
+            if fragment is not None and fragment.expires is not None and \
+                    fragment.expires <= datetime.utcnow():
+                self._drop(key)
+                fragment = None
+            if fragment is None:
+                self.misses += 1
+                return None, key
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fragment, key
+
+    def put(self, key, fragment):
+        size = _size(fragment)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # touched since the miss: the page may show the old data
+            if key != self._key(key[0], key[1]):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = fragment
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def touch(self, kind, entity_id=None):
+        with self._lock:
+            if entity_id is None:
+                self._generations[kind] = self._generations.get(kind, 0) + 1
+                stale = [key for key in self._entries if key[0] == kind]
+            else:
+                stale = [self._key(kind, entity_id)]
+                self._revisions[(kind, entity_id)] = \
+                    self._revisions.get((kind, entity_id), 0) + 1
+            for key in stale:
+                if key in self._entries:
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+        }
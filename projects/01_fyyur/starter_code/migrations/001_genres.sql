@@ -0,0 +1,68 @@
+-- Moves genres out of the packed "Artist".genres column into a "Genre" table
+-- linked to venues and artists, and backfills the artist links from it.
+-- An ARRAY column is unnested as it is. A string column may hold comma
+-- separated values ('Jazz,Classical') or a Postgres array literal
+-- ('{Jazz,"Rock, Pop"}'); literals are cast to text[] and unnested, so
+-- quoted elements keep their commas.
+-- Run once against an existing database: psql fyyur -f migrations/001_genres.sql
+
+BEGIN;
+
+CREATE TABLE "Genre" (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(120) NOT NULL UNIQUE
+);
+
+CREATE TABLE venue_genres (
+    venue_id INTEGER NOT NULL REFERENCES "Venue" (id) ON DELETE CASCADE,
+    genre_id INTEGER NOT NULL REFERENCES "Genre" (id) ON DELETE CASCADE,
+    PRIMARY KEY (venue_id, genre_id)
+);
+CREATE INDEX ix_venue_genres_genre_id_venue_id ON venue_genres (genre_id, venue_id);
+
+CREATE TABLE artist_genres (
+    artist_id INTEGER NOT NULL REFERENCES "Artist" (id) ON DELETE CASCADE,
+    genre_id INTEGER NOT NULL REFERENCES "Genre" (id) ON DELETE CASCADE,
+    PRIMARY KEY (artist_id, genre_id)
+);
+CREATE INDEX ix_artist_genres_genre_id_artist_id ON artist_genres (genre_id, artist_id);
+
+CREATE TEMPORARY TABLE packed_genres (
+    artist_id INTEGER NOT NULL,
+    name TEXT
+) ON COMMIT DROP;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'Artist' AND column_name = 'genres') = 'ARRAY' THEN
+        INSERT INTO packed_genres (artist_id, name)
+        SELECT a.id, trim(g.name)
+        FROM "Artist" a, unnest(a.genres) AS g (name);
+    ELSE
+        INSERT INTO packed_genres (artist_id, name)
+        SELECT a.id, trim(g.name)
+        FROM "Artist" a,
+             unnest(CASE WHEN trim(a.genres) LIKE '{%}'
+                         THEN trim(a.genres)::text[]
+                         ELSE string_to_array(a.genres, ',')
+                    END) AS g (name)
+        WHERE a.genres IS NOT NULL;
+    END IF;
+END
+$$;
+
+DELETE FROM packed_genres WHERE name IS NULL OR name = '';
+
+INSERT INTO "Genre" (name)
+SELECT DISTINCT name FROM packed_genres ORDER BY name;
+
+INSERT INTO artist_genres (artist_id, genre_id)
+SELECT DISTINCT p.artist_id, g.id
+FROM packed_genres p
+JOIN "Genre" g ON g.name = p.name;
+
+ALTER TABLE "Artist" DROP COLUMN genres;
+
+COMMIT;
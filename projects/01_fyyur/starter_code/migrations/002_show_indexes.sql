@@ -0,0 +1,20 @@
+-- Adds the composite (venue_id, start_time) and (artist_id, start_time)
+-- indexes that venue_shows() and artist_shows() read a page's shows through.
+-- Creates the "Show" table first on a database that predates it.
+-- Safe to run more than once: psql fyyur -f migrations/002_show_indexes.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS "Show" (
+    id SERIAL PRIMARY KEY,
+    venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+    artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+    start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_show_venue_id_start_time ON "Show" (venue_id, start_time);
+CREATE INDEX IF NOT EXISTS ix_show_artist_id_start_time ON "Show" (artist_id, start_time);
+
+COMMIT;
+
+ANALYZE "Show";
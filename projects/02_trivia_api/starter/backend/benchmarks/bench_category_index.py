@@ -0,0 +1,133 @@
+'''
+Before/after benchmark for the typed questions.category column
+
+Builds two SQLite databases holding the same generated questions: one with
+the old text category column and no index, one with the integer foreign key
+and the (category, id) index from migrations/002_question_category_fk.sql.
+The category endpoints are then timed against each.
+
+    python -m benchmarks.bench_category_index --questions 200000
+'''
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from flaskr import create_app
+from .datagen import CATEGORY_NAMES as CATEGORIES, generate_questions
+
+SCHEMAS = {
+    'before': [
+        'CREATE TABLE categories (id INTEGER PRIMARY KEY, type TEXT)',
+        'CREATE TABLE questions (id INTEGER PRIMARY KEY, question TEXT, '
+        'answer TEXT, category TEXT, difficulty INTEGER)',
+    ],
+    'after': [
+        'CREATE TABLE categories (id INTEGER PRIMARY KEY, type TEXT)',
+        'CREATE TABLE questions (id INTEGER PRIMARY KEY, question TEXT, '
+        'answer TEXT, category INTEGER REFERENCES categories (id) '
+        'ON UPDATE CASCADE ON DELETE SET NULL, difficulty INTEGER)',
+        'CREATE INDEX questions_category_id_idx ON questions (category, id)',
+    ]
+}
+
+
+def build_database(path, schema, count):
+    connection = sqlite3.connect(path)
+    with connection:
+        for statement in schema:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO categories (type) VALUES (?)',
+            [(category,) for category in CATEGORIES])
+        connection.executemany(
+            'INSERT INTO questions (question, answer, category, difficulty) '
+            'VALUES (:question, :answer, :category, :difficulty)',
+            generate_questions(count))
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+def time_requests(client, requests):
+    timings = []
+    for method, url, body in requests:
+        started = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1]
+    }
+
+
+def build_requests(count, repeat, seed=1):
+    generator = random.Random(seed)
+    deep_page = max(1, count // len(CATEGORIES) // 10 // 2)
+
+    def category():
+        return generator.randint(1, len(CATEGORIES))
+
+    return {
+        'GET /categories/<id>/questions': [
+            ('GET', '/categories/{}/questions'.format(category()), None)
+            for _ in range(repeat)],
+        'GET /categories/<id>/questions?page=<deep>': [
+            ('GET', '/categories/{}/questions?page={}'.format(
+                category(), deep_page), None)
+            for _ in range(repeat)],
+        'GET /categories/<id>/questions?after_id=<mid>': [
+            ('GET', '/categories/{}/questions?after_id={}'.format(
+                category(), count // 2), None)
+            for _ in range(repeat)],
+        'POST /quizzes': [
+            ('POST', '/quizzes', {
+                'previous_questions': [],
+                'quiz_category': {'type': '', 'id': category()}})
+            for _ in range(repeat)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--questions', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    requests = build_requests(args.questions, args.repeat)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for variant, schema in SCHEMAS.items():
+            path = os.path.join(directory, variant + '.db')
+            build_database(path, schema, args.questions)
+
+            app = create_app({
+                'DATABASE_URL': 'sqlite:///' + path,
+                'SEARCH_BACKEND': 'like'
+            })
+            client = app.test_client()
+            for endpoint, endpoint_requests in requests.items():
+                results[endpoint, variant] = time_requests(
+                    client, endpoint_requests)
+
+    print('{} questions, {} requests per endpoint (ms)'.format(
+        args.questions, args.repeat))
+    print('{:48} {:>6} {:>10} {:>10}'.format(
+        'endpoint', '', 'before', 'after'))
+    for endpoint in requests:
+        for stat in ('mean', 'p50', 'p95'):
+            print('{:48} {:>6} {:>10.3f} {:>10.3f}'.format(
+                endpoint if stat == 'mean' else '', stat,
+                results[endpoint, 'before'][stat],
+                results[endpoint, 'after'][stat]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+'''
+Synthetic trivia datasets
+
+Generates categories x questions x difficulty datasets and loads them into
+any database SQLAlchemy can reach (SQLite file, local Postgres), or writes
+them as a JSONL file for POST /questions/import.
+
+    python -m benchmarks.datagen --database-url sqlite:////tmp/trivia.db \
+        --categories 6 --questions 100000
+    python -m benchmarks.datagen --output questions.jsonl --questions 100000
+'''
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import create_engine
+
+from models import db, Question, Category
+
+CATEGORY_NAMES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+                  'Sports']
+SUBJECTS = ['title', 'capital', 'author', 'inventor', 'painter', 'river',
+            'planet', 'element', 'composer', 'champion', 'director', 'city']
+TOPICS = ['the first film', 'the tallest mountain', 'the oldest university',
+          'the largest lake', 'the fastest bird', 'the longest novel',
+          'the brightest star', 'the smallest country', 'the deepest ocean',
+          'the best selling album']
+LOAD_BATCH_SIZE = 5000
+
+
+def category_names(count):
+    return [
+        CATEGORY_NAMES[number] if number < len(CATEGORY_NAMES)
+        else 'Category {}'.format(number + 1)
+        for number in range(count)
+    ]
+
+
+'''
+generate_questions(count, categories, difficulties, seed)
+    yields count question rows as dicts of Question column values
+    category ids run from 1 to categories; the same seed always gives the
+    same dataset
+'''
+
+
+def generate_questions(count, categories=len(CATEGORY_NAMES),
+                       difficulties=5, seed=0):
+    generator = random.Random(seed)
+    for number in range(1, count + 1):
+        subject = generator.choice(SUBJECTS)
+        topic = generator.choice(TOPICS)
+        yield {
+            'question': 'What is the {} of {} (#{})?'.format(
+                subject, topic, number),
+            'answer': 'Answer {}'.format(number),
+            'category': generator.randint(1, categories),
+            'difficulty': generator.randint(1, difficulties)
+        }
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+'''
+load_dataset(database_url, questions, categories, difficulties, seed)
+    drops and recreates the trivia tables at database_url and fills them
+    with a generated dataset; returns the number of seconds it took
+'''
+
+
+def load_dataset(database_url, questions, categories=len(CATEGORY_NAMES),
+                 difficulties=5, seed=0):
+    started = time.perf_counter()
+    engine = create_engine(database_url)
+    db.Model.metadata.drop_all(engine)
+    db.Model.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            Category.__table__.insert(),
+            [{'type': name} for name in category_names(categories)])
+
+    rows = generate_questions(questions, categories, difficulties, seed)
+    for batch in _batches(rows, LOAD_BATCH_SIZE):
+        with engine.begin() as connection:
+            connection.execute(Question.__table__.insert(), batch)
+
+    if engine.dialect.name in ('postgresql', 'sqlite'):
+        with engine.begin() as connection:
+            connection.execute('ANALYZE')
+
+    engine.dispose()
+    return time.perf_counter() - started
+
+
+def write_dataset(path, questions, categories=len(CATEGORY_NAMES),
+                  difficulties=5, seed=0):
+    with open(path, 'w', encoding='utf-8') as output:
+        for row in generate_questions(
+                questions, categories, difficulties, seed):
+            output.write(json.dumps(row) + '\n')
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--difficulties', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--database-url')
+    target.add_argument('--output', help='write a JSONL file instead')
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    if args.output:
+        write_dataset(args.output, args.questions, args.categories,
+                      args.difficulties, args.seed)
+        print('Wrote {} questions to {}'.format(args.questions, args.output))
+    else:
+        seconds = load_dataset(args.database_url, args.questions,
+                               args.categories, args.difficulties, args.seed)
+        print('Loaded {} questions in {} categories in {:.1f}s'.format(
+            args.questions, args.categories, seconds))
+
+
+if __name__ == '__main__':
+    main()
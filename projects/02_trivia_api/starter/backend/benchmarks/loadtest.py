@@ -0,0 +1,255 @@
+'''
+Concurrent load test for every trivia API route
+
+Serves create_app() on a local threaded WSGI server and drives it with
+concurrent clients for a fixed time, then reports requests per second and
+p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.loadtest --questions 100000 --clients 8
+    python -m benchmarks.loadtest --database-url postgresql://localhost/bench \
+        --skip-load --clients 16 --duration 30
+'''
+import argparse
+import json
+import os
+import random
+import secrets
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from flaskr import create_app
+from .datagen import add_dataset_arguments, generate_questions, load_dataset
+
+'''
+Scenarios
+    each scenario is a weighted (endpoint name, request builder) pair; the
+    builder gets the client's state and returns method, path, JSON body and
+    headers
+'''
+
+
+class ClientState:
+    def __init__(self, seed, args, import_token):
+        self.random = random.Random(seed)
+        self.args = args
+        self.import_token = import_token
+        self.quiz_session = None
+        self.created = []
+
+    def category(self):
+        return self.random.randint(1, self.args.categories)
+
+    def page(self, per_page=10, categories=1):
+        last_page = max(1, self.args.questions // categories // per_page)
+        return self.random.randint(1, min(last_page, 50))
+
+
+def list_categories(state):
+    return 'GET', '/categories', None, {}
+
+
+def list_questions(state):
+    return 'GET', '/questions?page={}'.format(state.page()), None, {}
+
+
+def list_questions_after_id(state):
+    after_id = state.random.randint(1, state.args.questions)
+    return 'GET', '/questions?after_id={}'.format(after_id), None, {}
+
+
+def list_category_questions(state):
+    path = '/categories/{}/questions?page={}'.format(
+        state.category(), state.page(categories=state.args.categories))
+    return 'GET', path, None, {}
+
+
+def search_questions(state):
+    term = state.random.choice(['title', 'capital', 'river', 'film', 'star'])
+    return 'POST', '/questions', {'searchTerm': term}, {}
+
+
+def create_question(state):
+    question = {'question': 'Load test question', 'answer': 'Load test',
+                'difficulty': 1, 'category': state.category()}
+    return 'POST', '/questions', question, {}
+
+
+def delete_question(state):
+    if not state.created:
+        return None
+    return 'DELETE', '/questions/{}'.format(state.created.pop()), None, {}
+
+
+def quiz_stateless(state):
+    body = {
+        'previous_questions': [
+            state.random.randint(1, state.args.questions) for _ in range(5)],
+        'quiz_category': {'type': '', 'id': state.category()}
+    }
+    return 'POST', '/quizzes', body, {}
+
+
+def quiz_session(state):
+    if state.quiz_session is None or state.random.random() < 0.1:
+        body = {'quiz_category': {'type': '', 'id': state.category()}}
+    else:
+        body = {'quiz_session': state.quiz_session}
+    return 'POST', '/quizzes', body, {}
+
+
+def import_questions(state):
+    rows = generate_questions(
+        20, state.args.categories, seed=state.random.random())
+    body = '\n'.join(json.dumps(row) for row in rows)
+    headers = {'Authorization': 'Bearer ' + state.import_token,
+               'Content-Type': 'application/x-ndjson'}
+    return 'POST', '/questions/import', body, headers
+
+
+SCENARIOS = [
+    ('GET /categories', list_categories, 10),
+    ('GET /questions', list_questions, 20),
+    ('GET /questions?after_id', list_questions_after_id, 10),
+    ('GET /categories/<id>/questions', list_category_questions, 15),
+    ('POST /questions (search)', search_questions, 15),
+    ('POST /questions (create)', create_question, 3),
+    ('DELETE /questions/<id>', delete_question, 3),
+    ('POST /quizzes (stateless)', quiz_stateless, 10),
+    ('POST /quizzes (session)', quiz_session, 12),
+    ('POST /questions/import', import_questions, 2),
+]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def send(base_url, method, path, body, headers):
+    if isinstance(body, str):
+        data = body.encode('utf-8')
+    elif body is not None:
+        data = json.dumps(body).encode('utf-8')
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+    else:
+        data = None
+
+    request = Request(base_url + path, data=data, method=method,
+                      headers=headers)
+    try:
+        with urlopen(request) as response:
+            return response.status, response.read()
+    except HTTPError as error:
+        return error.code, error.read()
+
+
+def run_client(base_url, state, deadline, results):
+    names = [name for name, _, _ in SCENARIOS]
+    builders = {name: builder for name, builder, _ in SCENARIOS}
+    weights = [weight for _, _, weight in SCENARIOS]
+
+    while time.perf_counter() < deadline:
+        name = state.random.choices(names, weights)[0]
+        built = builders[name](state)
+        if built is None:
+            continue
+        method, path, body, headers = built
+
+        started = time.perf_counter()
+        status, payload = send(base_url, method, path, body, headers)
+        elapsed = time.perf_counter() - started
+
+        results[name].append((elapsed, status < 400))
+        if status >= 400:
+            continue
+
+        data = json.loads(payload)
+        if name == 'POST /questions (create)':
+            state.created.append(data['created'])
+        elif name == 'POST /quizzes (session)':
+            state.quiz_session = (
+                data['quiz_session'] if data['question'] else None)
+
+
+def percentile(timings, fraction):
+    index = max(0, int(round(fraction * len(timings))) - 1)
+    return timings[index] * 1000
+
+
+def report(results, seconds):
+    print('{:32} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+        'p99 ms'))
+    for name, _, _ in SCENARIOS:
+        samples = results.get(name)
+        if not samples:
+            continue
+        timings = sorted(elapsed for elapsed, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        print('{:32} {:>8} {:>7} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            name, len(samples), errors, len(samples) / seconds,
+            percentile(timings, 0.50), percentile(timings, 0.95),
+            percentile(timings, 0.99)))
+
+    total = sum(len(samples) for samples in results.values())
+    print('total: {} requests, {:.1f} req/s'.format(total, total / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database-url',
+                        help='defaults to a temporary SQLite file')
+    parser.add_argument('--skip-load', action='store_true',
+                        help='use the data already in --database-url')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(
+            directory, 'loadtest.db')
+        if not args.skip_load:
+            seconds = load_dataset(database_url, args.questions,
+                                   args.categories, args.difficulties,
+                                   args.seed)
+            print('Loaded {} questions in {:.1f}s'.format(
+                args.questions, seconds))
+
+        import_token = secrets.token_hex(16)
+        app = create_app({
+            'DATABASE_URL': database_url,
+            'IMPORT_TOKEN': import_token
+        })
+        server = make_server('127.0.0.1', 0, app, threaded=True,
+                             request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = 'http://127.0.0.1:{}'.format(server.server_port)
+
+        results = defaultdict(list)
+        deadline = time.perf_counter() + args.duration
+        clients = [
+            threading.Thread(target=run_client, args=(
+                base_url, ClientState(seed, args, import_token), deadline,
+                results))
+            for seed in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        seconds = time.perf_counter() - started
+
+        server.shutdown()
+        report(results, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,48 @@
 import os
+import hmac
+import io
+import click
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from werkzeug.exceptions import HTTPException
 
-from models import setup_db, db, Question, Category
+from models import setup_db, db, Question, Category, DB_PATH
+from .pagination import paginate, QUESTIONS_PER_PAGE
+from .quiz import (
+    question_index, QuizSessionStore, QUIZ_SESSION_TTL, ALL_CATEGORIES)
+from .search import create_search_backend
+from .cache import category_cache, CATEGORY_CACHE_TTL
+from .ingest import import_questions, IMPORT_BATCH_SIZE
+from .revision import conditional_get, revision
+from .instrumentation import init_instrumentation
 
-QUESTIONS_PER_PAGE = 10
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl'
+}
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.update(test_config)
+    setup_db(app, app.config.get('DATABASE_URL', DB_PATH))
+    question_index.clear()
+    revision.setup()
+    quiz_sessions = QuizSessionStore(
+        ttl=app.config.get('QUIZ_SESSION_TTL', QUIZ_SESSION_TTL))
+    search_backend = create_search_backend(app)
+    category_cache.ttl = app.config.get(
+        'CATEGORY_CACHE_TTL', CATEGORY_CACHE_TTL)
+    category_cache.invalidate()
+    import_token = app.config.get('IMPORT_TOKEN', os.getenv('IMPORT_TOKEN'))
+    import_batch_size = app.config.get('IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+    if app.config.get('SQL_INSTRUMENTATION',
+                      os.getenv('SQL_INSTRUMENTATION') == '1'):
+        init_instrumentation(app)
 
     '''
   @TODO: Set up CORS. Allow '*' for origins.
@@ -32,33 +62,11 @@ def create_app(test_config=None):
         return response
 
     def get_categories_list():
-        categories = (
-            Category.query
-            .order_by(Category.type)
-            .all()
-        )
-        category_list = {
-            category.id: category.type for category in categories}
-
-        return category_list
-
-    def paginate_questions(request, questions, items=QUESTIONS_PER_PAGE):
-        page = request.args.get('page', 1, type=int)
-        start = (page - 1) * items
-        end = start + items
+        return category_cache.get()
 
-        results = [question.format() for question in questions]
-
-        return results[start:end]
-
-    def get_question_list():
-        questions = (
-            Question.query
-            .order_by(Question.id)
-            .all()
-        )
-
-        return questions
+    def paginate_questions(request, query, items=QUESTIONS_PER_PAGE,
+                           order_by=None):
+        return paginate(request, query, Question.id, items, order_by)
 
     def get_question_by_id(question_id):
         question = (
@@ -76,41 +84,28 @@ def create_app(test_config=None):
 
         return question
 
-    def count(type):
-        if type:
-            count = type.query.count()
-        else:
-            abort(422)
-
-        return count
-
     def search_questions(search_term):
-        search_results = (
-            Question.query
-            .filter(Question.question.ilike('%' + search_term + '%'))
-            .all()
-        )
+        return search_backend.search(search_term)
 
-        return search_results
+    def check_quiz_category(category_id):
+        if (
+            category_id != ALL_CATEGORIES and
+            category_id not in category_cache
+        ):
+            abort(404)
 
     def get_quiz_question(cat_id, previous_q):
-        if cat_id == 0:
-            quiz_questions = (
-                Question.query
-                .filter(Question.id.notin_(previous_q))
-                .all()
-            )
-        else:
-            quiz_questions = (
-                Question.query
-                .filter(Question.category == cat_id,
-                        Question.id.notin_(previous_q))
-                .all()
-            )
+        while True:
+            question_id = question_index.pick(int(cat_id), previous_q)
+            if question_id is None:
+                return None
 
-        quiz_question = random.choice(quiz_questions).format()
+            question = get_question_by_id(question_id)
+            if question is not None:
+                return question.format()
 
-        return quiz_question
+            # the row was removed behind the index's back
+            question_index.remove(question_id)
 
     '''
   @TODO:
@@ -118,6 +113,7 @@ def create_app(test_config=None):
   for all available categories.
   '''
     @app.route('/categories', methods=['GET'])
+    @conditional_get
     def get_categories():
 
         all_categories = get_categories_list()
@@ -145,18 +141,19 @@ def create_app(test_config=None):
   Clicking on the page numbers should update the questions.
   '''
     @app.route('/questions', methods=['GET'])
+    @conditional_get
     def get_questions():
 
-        questions = get_question_list()
-        all_questions = paginate_questions(request, questions)
+        questions = paginate_questions(request, Question.query)
         all_categories = get_categories_list()
 
-        if len(all_questions):
+        if len(questions.items):
             return jsonify({
                 'success': True,
                 'status_code': 200,
-                'questions': all_questions,
-                'total_questions': (len(questions)),
+                'questions': questions.format(),
+                'total_questions': questions.total,
+                'next_after_id': questions.next_after_id,
                 'categories': all_categories,
                 'current_category': None
             })
@@ -210,8 +207,11 @@ def create_app(test_config=None):
 
                 new_question = data['question'].strip()
                 new_answer = data['answer'].strip()
-                new_difficulty = data['difficulty']
-                new_category = data['category']
+                try:
+                    new_difficulty = int(data['difficulty'])
+                    new_category = int(data['category'])
+                except (TypeError, ValueError):
+                    abort(400)
 
                 try:
                     question = Question(
@@ -222,15 +222,15 @@ def create_app(test_config=None):
                     )
                     question.insert()
 
-                    questions = get_question_list()
-                    all_questions = paginate_questions(request, questions)
+                    questions = paginate_questions(request, Question.query)
 
                     return jsonify({
                         'success': True,
                         'status_code': 200,
                         'message': 'Question created',
-                        'questions': all_questions,
-                        'total_questions': count(Question)
+                        'created': question.id,
+                        'questions': questions.format(),
+                        'total_questions': questions.total
                     })
                 except Exception as error:
                     print(error)
@@ -239,23 +239,85 @@ def create_app(test_config=None):
         else:
             try:
                 search_term = data['searchTerm'].strip()
-                search_data = search_questions(search_term)
-                questions_list = paginate_questions(request, search_data)
-
-                i = 0
-                for question in search_data:
-                    i += 1
+                search_data, ranking = search_questions(search_term)
+                questions = paginate_questions(
+                    request, search_data, order_by=ranking)
 
                 return jsonify({
                     'success': True,
                     'status_code': 200,
-                    'questions': questions_list,
-                    'total_questions': i,
+                    'questions': questions.format(),
+                    'total_questions': questions.total,
+                    'next_after_id': questions.next_after_id,
                     'currentCategory': None
                 })
+            except HTTPException:
+                raise
             except Exception as error:
                 print(error)
 
+    '''
+  Bulk import of questions from a JSONL or CSV file.
+  Requires the IMPORT_TOKEN as a bearer token; the endpoint is
+  disabled when no token is configured.
+  '''
+    def check_import_token():
+        if not import_token:
+            abort(403)
+
+        auth_header = request.headers.get('Authorization', '')
+        header_parts = auth_header.split(' ')
+        if (
+            len(header_parts) != 2 or
+            header_parts[0].lower() != 'bearer' or
+            not hmac.compare_digest(header_parts[1], import_token)
+        ):
+            abort(401)
+
+    @app.route('/questions/import', methods=['POST'])
+    def bulk_import_questions():
+        check_import_token()
+
+        import_format = request.args.get(
+            'format', IMPORT_FORMATS.get(request.mimetype))
+        batch_size = request.args.get(
+            'batch_size', import_batch_size, type=int)
+        if import_format not in ('csv', 'jsonl') or batch_size < 1:
+            abort(400)
+
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+        report = import_questions(stream, import_format, batch_size)
+
+        return jsonify({
+            'success': True,
+            'status_code': 200,
+            'message': 'Questions imported',
+            'import': report.format()
+        })
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'import_format',
+                  type=click.Choice(['csv', 'jsonl']),
+                  help='File format. Defaults to the file extension.')
+    @click.option('--batch-size', default=import_batch_size, show_default=True,
+                  help='Rows inserted per batch.')
+    def import_questions_command(path, import_format, batch_size):
+        """Bulk import questions from a JSONL or CSV file."""
+        if import_format is None:
+            import_format = 'csv' if path.endswith('.csv') else 'jsonl'
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            report = import_questions(stream, import_format, batch_size)
+
+        click.echo('Inserted {} questions in {:.2f}s ({} rows/s)'.format(
+            report.inserted, report.seconds,
+            report.format()['rows_per_second']))
+        if report.rejected:
+            click.echo('Rejected {} rows:'.format(report.rejected))
+            for reject in report.rejects:
+                click.echo('  line {line}: {error}'.format(**reject))
+
     '''
   @TODO:
   Create a POST endpoint to get questions based on a search term.
@@ -276,23 +338,23 @@ def create_app(test_config=None):
   category to be shown.
   '''
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    @conditional_get
     def get_questions_by_category(category_id):
-        if category_id <= count(Category):
+        if category_id in category_cache:
             try:
-                questions = get_questions_by_category_id(category_id)
-                questions_list = [question.format() for question in questions]
-
-                i = 0
-                for question in questions_list:
-                    i += 1
+                questions = paginate_questions(
+                    request, get_questions_by_category_id(category_id))
 
                 return jsonify({
                     'success': True,
                     'status_code': 200,
-                    'questions': questions_list,
-                    'totalQuestions': i,
+                    'questions': questions.format(),
+                    'totalQuestions': questions.total,
+                    'next_after_id': questions.next_after_id,
                     'currentCategory': category_id
                 })
+            except HTTPException:
+                raise
             except Exception as error:
                 print(error)
         else:
@@ -311,14 +373,19 @@ def create_app(test_config=None):
   '''
     @app.route('/quizzes', methods=['POST'])
     def create_quiz():
-        try:
-            data = request.get_json()
+        data = request.get_json()
 
-            if data:
+        if not data:
+            abort(422)
 
-                previous_questions = data['previous_questions']
-                category_type = data['quiz_category']['type']
+        # Stateless mode: the client sends every question it has seen
+        if data.get('quiz_session') is None and 'previous_questions' in data:
+            try:
+                previous_questions = [
+                    int(question_id)
+                    for question_id in data['previous_questions']]
                 category_id = data['quiz_category']['id']
+                check_quiz_category(int(category_id))
 
                 quiz_question = get_quiz_question(
                     category_id, previous_questions)
@@ -330,10 +397,37 @@ def create_app(test_config=None):
                     'question': quiz_question,
                     'quiz_category': category_id
                 })
-            else:
+            except HTTPException:
+                raise
+            except Exception as error:
+                print(error)
+                abort(422)
+
+        # Session mode: the seen questions are kept server-side
+        token = data.get('quiz_session')
+        if token:
+            session = quiz_sessions.get(token)
+            if session is None:
+                abort(404)
+        else:
+            try:
+                category_id = int(data['quiz_category']['id'])
+            except (KeyError, TypeError, ValueError):
                 abort(422)
-        except Exception as error:
-            print(error)
+            check_quiz_category(category_id)
+            token, session = quiz_sessions.create(category_id)
+
+        quiz_question = get_quiz_question(session.category_id, session.seen)
+        if quiz_question is not None:
+            session.seen.append(quiz_question['id'])
+
+        return jsonify({
+            'success': True,
+            'status_code': 200,
+            'quiz_session': token,
+            'question': quiz_question,
+            'quiz_category': session.category_id
+        })
 
     '''
   @TODO:
@@ -348,6 +442,22 @@ def create_app(test_config=None):
             'message': 'Request failed: Check your syntax and punctuation'
         }), 400
 
+    @app.errorhandler(401)
+    def unauthorized(error):
+        return jsonify({
+            'success': False,
+            'status_code': 401,
+            'message': 'Authorization required'
+        }), 401
+
+    @app.errorhandler(403)
+    def forbidden(error):
+        return jsonify({
+            'success': False,
+            'status_code': 403,
+            'message': 'Forbidden'
+        }), 403
+
     @app.errorhandler(404)
     def not_found_error(error):
         return jsonify({
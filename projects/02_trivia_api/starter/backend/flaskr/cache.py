@@ -0,0 +1,67 @@
+import threading
+import time
+
+from models import Category
+from .revision import revision
+
+CATEGORY_CACHE_TTL = 5 * 60
+
+'''
+CategoryCache
+    the {id: type} category map, ordered by type, loaded with one query and
+    then served from memory for as long as the revision ETag
+    (flaskr/revision.py) is the one it was loaded at, and at most ttl
+    seconds
+    the ETag moves with every committed change made by any process, so the
+    map is never older than the ETag a response is sent with; the ttl only
+    bounds how long a psql change without the revision triggers can go
+    unseen
+    the map is shared between callers and must be treated as read-only
+'''
+
+
+class CategoryCache:
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._categories = None
+        self._etag = None
+        self._expires = 0
+
+    def _load(self):
+        categories = (
+            Category.query
+            .order_by(Category.type)
+            .all()
+        )
+
+        return {category.id: category.type for category in categories}
+
+    def get(self):
+        # read before the map so the map is never older than the ETag
+        etag = revision.etag()
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._categories is None or
+                self._etag != etag or
+                now >= self._expires
+            ):
+                self._categories = self._load()
+                self._etag = etag
+                self._expires = now + self.ttl
+
+            return self._categories
+
+    def count(self):
+        return len(self.get())
+
+    def __contains__(self, category_id):
+        return category_id in self.get()
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+
+category_cache = CategoryCache()
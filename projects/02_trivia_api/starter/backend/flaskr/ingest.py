@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import time
+
+from models import db, Question
+from .cache import category_cache
+from .revision import revision
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_REJECTS = 1000
+QUESTION_FIELDS = ('question', 'answer', 'category', 'difficulty')
+
+'''
+read_questions(stream, format)
+    streams (line number, row) pairs from a JSONL or CSV text stream
+    without reading the whole file into memory
+    a line that cannot be decoded is yielded as (line number, None)
+'''
+
+
+def read_questions(stream, format):
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+    else:
+        raise ValueError('Unsupported import format: ' + str(format))
+
+
+'''
+validate_question(row, categories)
+    returns the row as a dict of insertable Question values, or raises
+    ValueError with the reason it was rejected
+'''
+
+
+def validate_question(row, categories):
+    if not isinstance(row, dict):
+        raise ValueError('Row is not a valid JSON object')
+
+    missing = [field for field in QUESTION_FIELDS if row.get(field) in
+               (None, '')]
+    if missing:
+        raise ValueError('Missing ' + ', '.join(missing))
+
+    question = str(row['question']).strip()
+    answer = str(row['answer']).strip()
+    if not question or not answer:
+        raise ValueError('Question and answer cannot be blank')
+
+    try:
+        category = int(row['category'])
+        difficulty = int(row['difficulty'])
+    except (TypeError, ValueError):
+        raise ValueError('Category and difficulty must be integers')
+
+    if category not in categories:
+        raise ValueError('Unknown category ' + str(category))
+    if not 1 <= difficulty <= 5:
+        raise ValueError('Difficulty must be between 1 and 5')
+
+    return {
+        'question': question,
+        'answer': answer,
+        'category': category,
+        'difficulty': difficulty
+    }
+
+
+'''
+ImportReport
+    counts, throughput and per-row rejects for one import run
+    only the first MAX_REPORTED_REJECTS rejects are kept in full
+'''
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, line_number, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({'line': line_number, 'error': reason})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def format(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'rejects': self.rejects,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': (
+                round(self.inserted / self.seconds) if self.seconds else 0)
+        }
+
+
+'''
+Batch writers
+    Postgres batches are streamed with COPY; other databases get a single
+    executemany INSERT per batch
+    each batch is committed on its own, so a failure part way through keeps
+    the batches already written
+'''
+
+
+def _copy_batch(batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([row[field] for field in QUESTION_FIELDS])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY questions (' + ', '.join(QUESTION_FIELDS) + ') '
+        'FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _insert_batch(batch):
+    db.session.execute(Question.__table__.insert(), batch)
+
+
+def _write_batch(batch):
+    if db.engine.dialect.name == 'postgresql':
+        _copy_batch(batch)
+    else:
+        _insert_batch(batch)
+    revision.bump(db.session.connection())
+    db.session.commit()
+
+
+'''
+import_questions(stream, format, batch_size)
+    validates and bulk inserts every question in the stream and returns
+    an ImportReport
+'''
+
+
+def import_questions(stream, format, batch_size=IMPORT_BATCH_SIZE):
+    categories = category_cache.get()
+    report = ImportReport()
+    batch = []
+
+    try:
+        for line_number, row in read_questions(stream, format):
+            try:
+                batch.append(validate_question(row, categories))
+            except ValueError as error:
+                report.reject(line_number, str(error))
+                continue
+
+            if len(batch) >= batch_size:
+                _write_batch(batch)
+                report.inserted += len(batch)
+                batch = []
+
+        if batch:
+            _write_batch(batch)
+            report.inserted += len(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        report.finish()
+
+    return report
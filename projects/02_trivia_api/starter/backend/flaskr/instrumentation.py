@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from models import db
+
+SQL_REPEAT_THRESHOLD = 10
+MAX_REPEATED_STATEMENTS = 20
+
+'''
+QueryStats
+    the queries run while serving one request: count, total time, the
+    slowest statement and how often each statement shape was executed
+'''
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = (0.0, None)
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[_shape(statement)] += 1
+        if seconds > self.slowest[0]:
+            self.slowest = (seconds, statement)
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.items()
+                if count > threshold]
+
+    def server_timing(self):
+        timing = 'db;desc="{} queries";dur={:.2f}'.format(
+            self.count, self.seconds * 1000)
+        if self.slowest[1] is not None:
+            timing += ', db-slowest;dur={:.2f}'.format(self.slowest[0] * 1000)
+        return timing
+
+
+def _shape(statement):
+    # parameters are already bound out of the SQL; only collapse whitespace
+    # and IN lists so the same query always has the same shape
+    shape = ' '.join(statement.split())
+    return re.sub(r'IN \([^)]*\)', 'IN (...)', shape)
+
+
+'''
+QuerySummary
+    per-endpoint totals across requests, served by GET /debug/sql
+'''
+
+
+class QuerySummary:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.repeated = []
+
+    def add(self, endpoint, stats, repeated):
+        with self._lock:
+            summary = self.endpoints.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'db_ms': 0.0,
+                'slowest_ms': 0.0,
+                'slowest_statement': None
+            })
+            summary['requests'] += 1
+            summary['queries'] += stats.count
+            summary['db_ms'] += stats.seconds * 1000
+            if stats.slowest[0] * 1000 > summary['slowest_ms']:
+                summary['slowest_ms'] = stats.slowest[0] * 1000
+                summary['slowest_statement'] = stats.slowest[1]
+
+            for shape, count in repeated:
+                self.repeated.append({
+                    'endpoint': endpoint,
+                    'statement': shape,
+                    'count': count
+                })
+            del self.repeated[:-MAX_REPEATED_STATEMENTS]
+
+    def format(self):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(
+                    summary,
+                    db_ms=round(summary['db_ms'], 3),
+                    slowest_ms=round(summary['slowest_ms'], 3),
+                    queries_per_request=round(
+                        summary['queries'] / summary['requests'], 2),
+                    db_ms_per_request=round(
+                        summary['db_ms'] / summary['requests'], 3))
+                for endpoint, summary in self.endpoints.items()
+            }
+            return {'endpoints': endpoints, 'repeated': list(self.repeated)}
+
+
+'''
+Engine hooks
+    time every statement the engine runs and charge it to the current
+    request, if there is one
+'''
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters,
+                          context, executemany):
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats.record(
+            statement, time.perf_counter() - context._query_started)
+
+
+def _listen(engine):
+    for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                           ('after_cursor_execute', _after_cursor_execute)):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+
+
+'''
+init_instrumentation(app)
+    opt-in per-request SQL instrumentation: adds a Server-Timing header to
+    every response, logs a warning when a request runs the same statement
+    shape more than SQL_REPEAT_THRESHOLD times (a likely N+1), and serves a
+    summary at GET /debug/sql
+'''
+
+
+def init_instrumentation(app):
+    threshold = app.config.get('SQL_REPEAT_THRESHOLD', SQL_REPEAT_THRESHOLD)
+    summary = QuerySummary()
+    _listen(db.get_engine(app))
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def finish_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        repeated = stats.repeated(threshold)
+        for shape, count in repeated:
+            app.logger.warning(
+                '%s %s ran the same statement %d times: %s',
+                request.method, request.path, count, shape)
+
+        summary.add(request.endpoint, stats, repeated)
+        response.headers.add('Server-Timing', stats.server_timing())
+        return response
+
+    @app.route('/debug/sql', methods=['GET'])
+    def sql_summary():
+        return jsonify({
+            'success': True,
+            'status_code': 200,
+            'sql': summary.format()
+        })
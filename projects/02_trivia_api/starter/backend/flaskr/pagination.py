@@ -0,0 +1,76 @@
+from flask import abort
+from sqlalchemy import func
+
+QUESTIONS_PER_PAGE = 10
+
+'''
+Page
+    a single page of results along with the total number of rows
+    matched by the underlying query
+'''
+
+
+class Page:
+    def __init__(self, items, total, page, per_page, next_after_id=None):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.next_after_id = next_after_id
+
+    def format(self):
+        return [item.format() for item in self.items]
+
+
+'''
+paginate(request, query, key)
+    pushes paging down into SQL instead of slicing a fully loaded list
+    ?page=<n> selects a page with LIMIT/OFFSET
+    ?after_id=<id> selects the rows following <id> on the key column
+        (keyset paging), which stays cheap for deep pages
+    the total is always answered by a separate COUNT on the same filters
+    order_by overrides the key ordering (e.g. ranked search results);
+        keyset paging is only available when ordering by the key
+'''
+
+
+def paginate(request, query, key, items=QUESTIONS_PER_PAGE, order_by=None):
+    page = request.args.get('page', 1, type=int)
+    after_id = request.args.get('after_id', None, type=int)
+
+    if page < 1:
+        abort(400)
+
+    total = (
+        query
+        .order_by(None)
+        .with_entities(func.count(key))
+        .scalar()
+    )
+
+    if after_id is not None:
+        if order_by is not None:
+            abort(400)
+
+        results = (
+            query
+            .filter(key > after_id)
+            .order_by(key)
+            .limit(items)
+            .all()
+        )
+    else:
+        ordering = order_by if order_by is not None else [key]
+        results = (
+            query
+            .order_by(*ordering)
+            .limit(items)
+            .offset((page - 1) * items)
+            .all()
+        )
+
+    next_after_id = None
+    if len(results) == items and order_by is None:
+        next_after_id = getattr(results[-1], key.key)
+
+    return Page(results, total, page, items, next_after_id)
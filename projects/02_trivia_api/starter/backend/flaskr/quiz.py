@@ -0,0 +1,260 @@
+import random
+import secrets
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question
+from .revision import revision
+
+ALL_CATEGORIES = 0
+QUIZ_SESSION_TTL = 60 * 60
+
+'''
+QuestionIndex
+    an in-memory, per-category index of question ids used to pick quiz
+    questions without loading the candidate rows
+    each category (and ALL_CATEGORIES) is loaded once, as a sorted list of
+    ids, the first time it is played
+    the index remembers the revision ETag (flaskr/revision.py) it was
+    loaded at and is dropped as soon as the ETag moves on, so questions
+    written by other workers, the import CLI or plain SQL are picked up on
+    the next quiz request; commits of this process that were the only
+    change since then are applied in place by the hooks below instead
+    a category is loaded without holding the lock; if the index changed
+    meanwhile the load is repeated, so a concurrent insert is not lost
+    callers must only ask for categories that exist
+'''
+
+
+class QuestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._etag = None
+        self._changes = 0
+
+    def clear(self):
+        with self._lock:
+            self._reset(None)
+
+    def _reset(self, etag):
+        self._ids = {}
+        self._etag = etag
+        self._changes += 1
+
+    def _load(self, category_id):
+        query = db.session.query(Question.id)
+        if category_id != ALL_CATEGORIES:
+            query = query.filter(Question.category == category_id)
+
+        return [row.id for row in query.order_by(Question.id)]
+
+    def _ids_for(self, category_id, etag):
+        while True:
+            with self._lock:
+                if self._etag != etag:
+                    self._reset(etag)
+                ids = self._ids.get(category_id)
+                if ids is not None:
+                    return ids
+                changes = self._changes
+
+            # read after the ETag, so the ids are never older than it
+            ids = self._load(category_id)
+
+            with self._lock:
+                if self._changes == changes:
+                    return self._ids.setdefault(category_id, ids)
+
+    '''
+    apply(changes, bumped)
+        applies the (action, question_id, category_id) changes of a commit
+        that moved the revision from bumped[0] to bumped[1]; if the index
+        is not at bumped[0], another change came first and the index is
+        left to be reloaded
+    '''
+
+    def apply(self, changes, bumped):
+        before, after = bumped
+        with self._lock:
+            if self._etag != before:
+                return
+            self._etag = after
+            self._changes += 1
+            for action, question_id, category_id in changes:
+                if action == 'add':
+                    self._add(question_id, category_id)
+                else:
+                    self._remove(question_id)
+
+    def remove(self, question_id):
+        with self._lock:
+            self._changes += 1
+            self._remove(question_id)
+
+    def _add(self, question_id, category_id):
+        for key in (ALL_CATEGORIES, category_id):
+            ids = self._ids.get(key)
+            if ids is None:
+                continue
+            position = bisect_left(ids, question_id)
+            if position == len(ids) or ids[position] != question_id:
+                ids.insert(position, question_id)
+
+    def _remove(self, question_id):
+        for ids in self._ids.values():
+            position = bisect_left(ids, question_id)
+            if position < len(ids) and ids[position] == question_id:
+                del ids[position]
+
+    '''
+    pick(category_id, exclude)
+        returns a random question id from the category that is not in
+        exclude, or None once the category has run out of questions
+        cost is O(len(exclude) * log n); the candidates are never scanned
+    '''
+
+    def pick(self, category_id, exclude=()):
+        ids = self._ids_for(category_id, revision.etag())
+        with self._lock:
+            seen = set()
+            for question_id in exclude:
+                position = bisect_left(ids, question_id)
+                if position < len(ids) and ids[position] == question_id:
+                    seen.add(position)
+
+            remaining = len(ids) - len(seen)
+            if remaining <= 0:
+                return None
+
+            # the k-th unseen id is found by stepping k past every seen
+            # position that falls at or before it
+            position = random.randrange(remaining)
+            for seen_position in sorted(seen):
+                if seen_position > position:
+                    break
+                position += 1
+
+            return ids[position]
+
+
+question_index = QuestionIndex()
+
+'''
+QuizSession
+    the server-side state of one quiz: its category and the ids of the
+    questions already served, packed into an array of unsigned ints
+'''
+
+
+class QuizSession:
+    __slots__ = ('category_id', 'seen', 'expires')
+
+    def __init__(self, category_id, expires):
+        self.category_id = category_id
+        self.seen = array('I')
+        self.expires = expires
+
+
+'''
+QuizSessionStore
+    quiz sessions keyed by an opaque token
+    sessions expire ttl seconds after they were last used; the store is
+    kept in last-used order so expired sessions are evicted from the
+    front on every access
+'''
+
+
+class QuizSessionStore:
+    def __init__(self, ttl=QUIZ_SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if session.expires > now:
+                break
+            del self._sessions[token]
+
+    def create(self, category_id):
+        token = secrets.token_urlsafe(16)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict(now)
+            session = QuizSession(category_id, now + self.ttl)
+            self._sessions[token] = session
+
+        return token, session
+
+    def get(self, token):
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(token)
+            if session is not None:
+                session.expires = now + self.ttl
+                self._sessions.move_to_end(token)
+
+        return session
+
+
+def _category_key(category):
+    return ALL_CATEGORIES if category is None else int(category)
+
+
+'''
+Index maintenance
+    changes are collected on the session while it flushes and are only
+    applied to the index once the transaction commits, so a rolled back
+    insert or delete never reaches it
+'''
+
+
+def _record(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('question_index', []).append(change)
+
+
+@event.listens_for(Question, 'after_insert')
+def _question_inserted(mapper, connection, target):
+    _record(target, ('add', target.id, _category_key(target.category)))
+
+
+@event.listens_for(Question, 'after_update')
+def _question_updated(mapper, connection, target):
+    history = inspect(target).attrs.category.history
+    if history.has_changes():
+        _record(target, ('remove', target.id, None))
+        _record(target, ('add', target.id, _category_key(target.category)))
+
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    _record(target, ('remove', target.id, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('question_index', [])
+    bumped = session.info.get('revision_bumped')
+    if bumped is not None:
+        question_index.apply(changes, bumped)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction):
+    session.info.pop('question_index', None)
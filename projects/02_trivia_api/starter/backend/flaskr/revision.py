@@ -0,0 +1,132 @@
+import secrets
+from functools import wraps
+
+from flask import request, make_response
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question, Category, DataRevision
+
+'''
+Revision
+    the data_revision row, bumped in the same transaction as every change
+    to questions or categories, so all workers and other writers (the
+    import CLI, psql once migrations/003_data_revision.sql has added its
+    triggers) move the ETags of every process
+    reading it is a single primary key lookup
+'''
+
+
+class Revision:
+    table = DataRevision.__table__
+    row_id = 1
+
+    def setup(self):
+        with db.engine.begin() as connection:
+            row = connection.execute(
+                select([self.table.c.id])
+                .where(self.table.c.id == self.row_id)).first()
+            if row is not None:
+                return
+            try:
+                connection.execute(self.table.insert(), {
+                    'id': self.row_id,
+                    'token': secrets.token_hex(4),
+                    'value': 0})
+            except IntegrityError:
+                # another process created it first
+                pass
+
+    '''
+    bump(connection)
+        moves the revision on in connection's transaction and returns the
+        ETags before and after (None before setup() has created the row);
+        the row stays locked until the transaction ends, so no other writer
+        can bump it in between
+    '''
+
+    def bump(self, connection):
+        connection.execute(
+            self.table.update()
+            .where(self.table.c.id == self.row_id)
+            .values(value=self.table.c.value + 1))
+        row = self._read(connection)
+        if row is None:
+            return None
+        return self._etag(row.token, row.value - 1), self._etag(*row)
+
+    def etag(self):
+        return self._etag(*self._read(db.session))
+
+    def _read(self, connection):
+        return connection.execute(
+            select([self.table.c.token, self.table.c.value])
+            .where(self.table.c.id == self.row_id)).first()
+
+    @staticmethod
+    def _etag(token, value):
+        return '{}-{}'.format(token, value)
+
+
+revision = Revision()
+
+'''
+conditional_get
+    view decorator that answers If-None-Match with a 304 before the view
+    runs, so an unchanged resource costs one primary key lookup; other
+    responses get an ETag and a Cache-Control that makes browsers
+    revalidate
+    there is no Last-Modified: a timestamp with one-second precision can
+    not tell apart two writes in the same second
+'''
+
+
+def conditional_get(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # read before the view runs so a concurrent write can only make
+        # the ETag older than the body, never newer
+        etag = revision.etag()
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+'''
+Revision hooks
+    the first insert, update or delete of a question or category in a
+    transaction bumps the revision on the same connection, so the bump
+    commits or rolls back with the change; bulk writes that bypass the
+    ORM call bump() themselves
+    session.info['revision_bumped'] holds the (before, after) ETags of the
+    bump until the transaction has ended, so after_commit listeners (see
+    flaskr/quiz.py) can tell whether theirs was the only change
+'''
+
+
+def _changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and not session.info.get('revision_bumped'):
+        session.info['revision_bumped'] = revision.bump(connection)
+
+
+for _model in (Question, Category):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _changed)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _reset(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('revision_bumped', None)
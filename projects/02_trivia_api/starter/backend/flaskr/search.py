@@ -0,0 +1,173 @@
+from sqlalchemy import column, desc, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Question
+
+'''
+SearchBackend
+    base class for question search backends
+    search(term) returns the matching Question query and the ordering to
+    rank it by (None keeps the default id order); both are passed straight
+    to paginate() so paging and totals stay in SQL
+'''
+
+
+class SearchBackend:
+    name = None
+
+    def setup(self):
+        pass
+
+    def search(self, term):
+        raise NotImplementedError
+
+
+'''
+LikeSearch
+    case-insensitive substring match; used when no better backend is
+    available for the database in use
+'''
+
+
+class LikeSearch(SearchBackend):
+    name = 'like'
+
+    def search(self, term):
+        query = (
+            Question.query
+            .filter(Question.question.ilike('%' + term + '%'))
+        )
+
+        return query, None
+
+
+'''
+PostgresSearch
+    full-text search ranked with ts_rank, plus ILIKE so that partial words
+    still match
+    migrations/001_question_search.sql creates the GIN indexes both
+    conditions use (a tsvector expression index and a pg_trgm index)
+'''
+
+
+class PostgresSearch(SearchBackend):
+    name = 'postgres'
+    language = 'english'
+
+    def search(self, term):
+        if not term:
+            return Question.query, None
+
+        document = func.to_tsvector(
+            self.language, func.coalesce(Question.question, ''))
+        terms = func.plainto_tsquery(self.language, term)
+
+        query = (
+            Question.query
+            .filter(or_(
+                document.op('@@')(terms),
+                Question.question.ilike('%' + term + '%')))
+        )
+
+        return query, [desc(func.ts_rank(document, terms)), Question.id]
+
+
+'''
+SQLiteSearch
+    FTS5 search for local and test runs
+    the trigram tokenizer keeps substring matching; the index is an
+    external-content table kept in sync with questions by triggers
+    setup only rebuilds the index when it creates it or when its row count
+    or highest id no longer match questions (e.g. rows written before the
+    triggers existed), so starting the app does not reindex every question
+'''
+
+
+class SQLiteSearch(SearchBackend):
+    name = 'sqlite'
+    fts = table('questions_fts', column('rowid'), column('rank'))
+    schema = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5("
+        "question, content='questions', content_rowid='id', "
+        "tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS questions_fts_insert "
+        "AFTER INSERT ON questions BEGIN "
+        "INSERT INTO questions_fts(rowid, question) "
+        "VALUES (new.id, new.question); END",
+        "CREATE TRIGGER IF NOT EXISTS questions_fts_delete "
+        "AFTER DELETE ON questions BEGIN "
+        "INSERT INTO questions_fts(questions_fts, rowid, question) "
+        "VALUES ('delete', old.id, old.question); END",
+        "CREATE TRIGGER IF NOT EXISTS questions_fts_update "
+        "AFTER UPDATE ON questions BEGIN "
+        "INSERT INTO questions_fts(questions_fts, rowid, question) "
+        "VALUES ('delete', old.id, old.question); "
+        "INSERT INTO questions_fts(rowid, question) "
+        "VALUES (new.id, new.question); END",
+    ]
+    exists = ("SELECT 1 FROM sqlite_master "
+              "WHERE type = 'table' AND name = 'questions_fts'")
+    in_sync = (
+        "SELECT (SELECT count(*) FROM questions) = "
+        "(SELECT count(*) FROM questions_fts_docsize) AND "
+        "coalesce((SELECT max(id) FROM questions), 0) = "
+        "coalesce((SELECT max(id) FROM questions_fts_docsize), 0)")
+    rebuild = "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"
+
+    def setup(self):
+        with db.engine.begin() as connection:
+            created = connection.execute(text(self.exists)).first() is None
+            for statement in self.schema:
+                connection.execute(text(statement))
+
+            if created or not connection.execute(text(self.in_sync)).scalar():
+                connection.execute(text(self.rebuild))
+
+    def search(self, term):
+        # trigrams need at least three characters to match on
+        if len(term) < 3:
+            return LikeSearch().search(term)
+
+        phrase = '"' + term.replace('"', '""') + '"'
+        query = (
+            Question.query
+            .join(self.fts, self.fts.c.rowid == Question.id)
+            .filter(literal_column('questions_fts').op('MATCH')(phrase))
+        )
+
+        return query, [self.fts.c.rank, Question.id]
+
+
+SEARCH_BACKENDS = {
+    backend.name: backend
+    for backend in (LikeSearch, PostgresSearch, SQLiteSearch)
+}
+
+DIALECT_BACKENDS = {
+    'postgresql': PostgresSearch.name,
+    'sqlite': SQLiteSearch.name
+}
+
+'''
+create_search_backend(app)
+    returns the backend named by app.config['SEARCH_BACKEND'], or the best
+    one for the database dialect
+    falls back to LikeSearch if the backend cannot be set up (e.g. SQLite
+    built without FTS5)
+'''
+
+
+def create_search_backend(app):
+    name = app.config.get('SEARCH_BACKEND')
+    if name is None:
+        name = DIALECT_BACKENDS.get(db.engine.dialect.name, LikeSearch.name)
+
+    backend = SEARCH_BACKENDS[name]()
+    try:
+        backend.setup()
+    except OperationalError as error:
+        app.logger.warning(
+            'search backend %s unavailable, using like: %s', name, error)
+        backend = LikeSearch()
+
+    return backend
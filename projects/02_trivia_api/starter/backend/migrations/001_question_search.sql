@@ -0,0 +1,24 @@
+--
+-- Indexes for POST /questions searches (see flaskr/search.py)
+--
+-- psql trivia < migrations/001_question_search.sql
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+--
+-- Full-text search on the question text; the expression must match
+-- the one used by PostgresSearch for the index to be used
+--
+
+CREATE INDEX IF NOT EXISTS questions_question_fts_idx
+    ON public.questions
+    USING GIN (to_tsvector('english', coalesce(question, '')));
+
+--
+-- Trigram index so that ILIKE '%term%' no longer scans the table
+--
+
+CREATE INDEX IF NOT EXISTS questions_question_trgm_idx
+    ON public.questions
+    USING GIN (question gin_trgm_ops);
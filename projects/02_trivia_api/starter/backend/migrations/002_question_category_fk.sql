@@ -0,0 +1,48 @@
+--
+-- Make questions.category an indexed integer foreign key to categories.id
+--
+-- psql trivia < migrations/002_question_category_fk.sql
+--
+
+BEGIN;
+
+--
+-- Databases created by db.create_all() before this change store the
+-- category as text; trivia.psql already uses an integer
+--
+
+ALTER TABLE public.questions
+    ALTER COLUMN category TYPE integer USING category::integer;
+
+--
+-- trivia.psql names this constraint "category"; only add it when no
+-- foreign key on the column exists yet
+--
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_constraint
+        WHERE conrelid = 'public.questions'::regclass
+          AND contype = 'f'
+    ) THEN
+        ALTER TABLE public.questions
+            ADD CONSTRAINT questions_category_fkey
+            FOREIGN KEY (category) REFERENCES public.categories(id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+--
+-- Serves the category filter and the id ordering of the category
+-- listing and quiz queries from one index
+--
+
+CREATE INDEX IF NOT EXISTS questions_category_id_idx
+    ON public.questions (category, id);
+
+COMMIT;
+
+ANALYZE public.questions;
@@ -0,0 +1,47 @@
+--
+-- Bump data_revision on every statement that changes questions or
+-- categories, so writes made outside the app (psql, other tools) also
+-- change the ETags of GET /categories and /questions
+--
+-- psql trivia < migrations/003_data_revision.sql
+--
+
+BEGIN;
+
+--
+-- The app creates this table and its row on start-up; create them here
+-- too so the migration can run first
+--
+
+CREATE TABLE IF NOT EXISTS public.data_revision (
+    id integer PRIMARY KEY,
+    token varchar(16) NOT NULL,
+    value bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO public.data_revision (id, token, value)
+VALUES (1, substr(md5(random()::text), 1, 8), 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.bump_data_revision() RETURNS trigger AS $$
+BEGIN
+    UPDATE public.data_revision SET value = value + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+--
+-- Statement level: a bulk INSERT or COPY bumps the revision once
+--
+
+DROP TRIGGER IF EXISTS questions_data_revision ON public.questions;
+CREATE TRIGGER questions_data_revision
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.questions
+    FOR EACH STATEMENT EXECUTE PROCEDURE public.bump_data_revision();
+
+DROP TRIGGER IF EXISTS categories_data_revision ON public.categories;
+CREATE TRIGGER categories_data_revision
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.categories
+    FOR EACH STATEMENT EXECUTE PROCEDURE public.bump_data_revision();
+
+COMMIT;
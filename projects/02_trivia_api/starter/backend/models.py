@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, \
+    Index, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -7,7 +8,9 @@ DB_HOST = os.getenv('DB_HOST', 'localhost:5432')
 DB_USER = os.getenv('DB_USER', 'udacity')
 DB_PWD = os.getenv('DB_PWD', '')
 DB_NAME = os.getenv('DB_NAME', 'trivia_test')
-DB_PATH = 'postgresql://{}/{}'.format(DB_HOST, DB_NAME, DB_USER, DB_PWD)
+DB_PATH = os.getenv(
+    'DATABASE_URL',
+    'postgresql://{}/{}'.format(DB_HOST, DB_NAME, DB_USER, DB_PWD))
 
 db = SQLAlchemy()
 
@@ -33,11 +36,17 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # serves both the category filter and the id ordering used by the
+        # category listing and quiz queries
+        Index('questions_category_id_idx', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey(
+        'categories.id', onupdate='CASCADE', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -87,3 +96,20 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+
+'''
+DataRevision
+    a single row counting committed changes to questions and categories,
+    shared by every process using the database; the token is random per
+    database so a recreated database never repeats an old ETag
+
+'''
+
+
+class DataRevision(db.Model):
+    __tablename__ = 'data_revision'
+
+    id = Column(Integer, primary_key=True)
+    token = Column(String(16), nullable=False)
+    value = Column(BigInteger, nullable=False, default=0)
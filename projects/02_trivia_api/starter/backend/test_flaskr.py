@@ -2,8 +2,10 @@ import os
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
 
 from flaskr import create_app
+from flaskr.revision import revision
 from models import setup_db, db, Question, Category
 
 DB_HOST = os.getenv('DB_HOST', 'localhost:5432')
@@ -72,6 +74,100 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['categories'])
         self.assertTrue(data['current_category'] == None)
 
+    def test_listQuestions_notModified(self):
+        response = self.client().get('/questions')
+        etag = response.headers['ETag']
+
+        response = self.client().get(
+            '/questions', headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data, b'')
+
+    def test_listQuestions_modified(self):
+        etag = self.client().get('/questions').headers['ETag']
+        dummy_question = {'question': 'etag_question',
+                          'answer': 'etag_answer',
+                          'difficulty': '1',
+                          'category': '1'}
+        self.client().post('/questions', json=dummy_question)
+
+        response = self.client().get(
+            '/questions', headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        # Remove the test question from the database
+        try:
+            Question.query.filter_by(question='etag_question').delete()
+            db.session.commit()
+        except:
+            db.session.rollback()
+
+    def test_sqlInstrumentation(self):
+        client = create_app({'SQL_INSTRUMENTATION': True}).test_client()
+
+        response = client.get('/questions')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Server-Timing'].startswith('db;'))
+
+        response = client.get('/debug/sql')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        summary = data['sql']['endpoints']['get_questions']
+        self.assertEqual(summary['requests'], 1)
+        self.assertTrue(summary['queries'])
+
+    def test_listQuestions_afterId(self):
+        first_page = json.loads(self.client().get('/questions').data)
+        after_id = first_page['questions'][0]['id']
+
+        response = self.client().get('/questions?after_id=' + str(after_id))
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'],
+                         first_page['total_questions'])
+        self.assertTrue(all(question['id'] > after_id
+                            for question in data['questions']))
+        self.assertEqual(data['questions'][0]['id'],
+                         first_page['questions'][1]['id'])
+
+    def test_listQuestions_fail_400(self):
+        response = self.client().get('/questions?page=0')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['status_code'], 400)
+        self.assertEqual(data['success'], False)
+
+    def test_createQuestion_fail_400_difficulty(self):
+        response = self.client().post('/questions', json={
+            'question': 'Who?', 'answer': 'Me',
+            'difficulty': 'hard', 'category': 1})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_listCategoryQuestions_fail_400_page(self):
+        response = self.client().get('/categories/1/questions?page=0')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_searchQuestions_fail_400_afterId(self):
+        response = self.client().post('/questions?after_id=1',
+                                      json={'searchTerm': 'title'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     def test_listQuestions_fail_500(self):
         response = self.client().post('/questions')
         data = json.loads(response.data)
@@ -145,6 +241,47 @@ class TriviaTestCase(unittest.TestCase):
             data['message'],
             'Request failed: Check your syntax and punctuation')
 
+    def test_importQuestions(self):
+        app = create_app({'IMPORT_TOKEN': 'test-token'})
+        rows = [
+            {'question': 'imported_question', 'answer': 'imported_answer',
+             'difficulty': 2, 'category': 1},
+            {'question': 'imported_question', 'answer': '',
+             'difficulty': 2, 'category': 1}
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows)
+
+        response = app.test_client().post(
+            '/questions/import', data=body,
+            content_type='application/x-ndjson',
+            headers={'Authorization': 'Bearer test-token'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['import']['inserted'], 1)
+        self.assertEqual(data['import']['rejected'], 1)
+        self.assertEqual(data['import']['rejects'][0]['line'], 2)
+
+        # Remove the imported question from the database
+        try:
+            Question.query.filter_by(question='imported_question').delete()
+            db.session.commit()
+        except:
+            db.session.rollback()
+
+    def test_importQuestions_fail_401(self):
+        app = create_app({'IMPORT_TOKEN': 'test-token'})
+
+        response = app.test_client().post(
+            '/questions/import', data='',
+            content_type='application/x-ndjson')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['status_code'], 401)
+        self.assertEqual(data['success'], False)
+
     def test_searchQuestion(self):
         search_term = {'searchTerm': 'tItLE'}
 
@@ -167,6 +304,16 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data['questions']))
         self.assertTrue(data['total_questions'])
 
+    def test_searchQuestion_noResults(self):
+        search_term = {'searchTerm': 'xyzzy-no-such-question'}
+
+        response = self.client().post('/questions', json=search_term)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['questions'], [])
+        self.assertEqual(data['total_questions'], 0)
+
     def test_questionByCategory(self):
 
         response = self.client().get('/categories/1/questions')
@@ -199,6 +346,93 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question'])
         self.assertEqual(data['quiz_category'], 1)
 
+    def test_quiz_exhausted(self):
+        previous_questions = [
+            question.id for question in
+            Question.query.filter(Question.category == 1)]
+        submission = {"previous_questions": previous_questions,
+                      "quiz_category": {"type": "Science", "id": 1}}
+
+        response = self.client().post('/quizzes', json=submission)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status_code'], 200)
+        self.assertEqual(data['question'], None)
+
+    def test_quiz_sees_questions_written_elsewhere(self):
+        previous_questions = [
+            question.id for question in
+            Question.query.filter(Question.category == 1)]
+        submission = {"previous_questions": previous_questions,
+                      "quiz_category": {"type": "Science", "id": 1}}
+        response = self.client().post('/quizzes', json=submission)
+        self.assertEqual(json.loads(response.data)['question'], None)
+
+        # another process writing with its own engine, as the import CLI
+        # or a second worker would
+        engine = create_engine(self.database_path)
+        table = Question.__table__
+        with engine.begin() as connection:
+            question_id = connection.execute(table.insert(), {
+                'question': 'Written elsewhere', 'answer': 'Yes',
+                'category': 1, 'difficulty': 1}).inserted_primary_key[0]
+            revision.bump(connection)
+
+        try:
+            response = self.client().post('/quizzes', json=submission)
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['question']['id'], question_id)
+        finally:
+            with engine.begin() as connection:
+                connection.execute(
+                    table.delete().where(table.c.id == question_id))
+                revision.bump(connection)
+            engine.dispose()
+
+    def test_quiz_fail_404_category(self):
+        submission = {"previous_questions": [],
+                      "quiz_category": {"type": "Unknown", "id": 999}}
+
+        response = self.client().post('/quizzes', json=submission)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_session(self):
+        submission = {"quiz_category": {"type": "Science", "id": 1}}
+
+        response = self.client().post('/quizzes', json=submission)
+        data = json.loads(response.data)
+        token = data['quiz_session']
+        served = [data['question']['id']]
+
+        while data['question']:
+            response = self.client().post(
+                '/quizzes', json={'quiz_session': token})
+            data = json.loads(response.data)
+            self.assertEqual(data['quiz_session'], token)
+            if data['question']:
+                served.append(data['question']['id'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('previousQuestions', data)
+        self.assertEqual(len(served), len(set(served)))
+        self.assertEqual(
+            len(served),
+            Question.query.filter(Question.category == 1).count())
+
+    def test_quiz_session_fail_404(self):
+        response = self.client().post(
+            '/quizzes', json={'quiz_session': 'expired'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
     def test_quiz_fail(self):
         submission = {'previous_questions': [
             1, 2], 'quiz_category': {'type': 'Science', 'id': 1}}
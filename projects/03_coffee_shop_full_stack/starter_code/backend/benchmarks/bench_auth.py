@@ -0,0 +1,142 @@
+'''
+Throughput benchmark for requires_auth
+
+Mints tokens with the local issuer, then has concurrent clients call a view
+protected by requires_auth, with and without the verified token cache.
+Reports tokens verified per second and the latency requires_auth adds over
+the same view without it.
+
+    python -m benchmarks.bench_auth --threads 8 --requests 500 --tokens 50
+    python -m benchmarks.bench_auth --http-jwks --modes uncached
+'''
+import argparse
+import statistics
+import threading
+import time
+
+from flask import Flask, jsonify
+
+from src.auth import auth
+from src.auth.issuer import LocalIssuer, serve_jwks
+from src.auth.jwks import UrlKeySource
+
+PERMISSION = 'get:drinks-detail'
+
+
+def create_bench_app():
+    app = Flask(__name__)
+
+    @app.route('/open')
+    def open_view():
+        return jsonify({'success': True})
+
+    @app.route('/protected')
+    @auth.requires_auth(PERMISSION)
+    def protected_view(payload):
+        return jsonify({'success': True})
+
+    @app.errorhandler(auth.AuthError)
+    def auth_error(error):
+        return jsonify({'success': False}), error.status_code
+
+    return app
+
+
+def run_client(app, path, tokens, offset, requests, timings, errors):
+    client = app.test_client()
+    for number in range(requests):
+        token = tokens[(offset + number) % len(tokens)]
+        headers = {'Authorization': 'Bearer ' + token}
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def run(app, path, tokens, threads, requests):
+    timings = []
+    errors = []
+    clients = [
+        threading.Thread(target=run_client, args=(
+            app, path, tokens, number * 7, requests, timings, errors))
+        for number in range(threads)
+    ]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    seconds = time.perf_counter() - started
+    return sorted(timings), errors, seconds
+
+
+def percentile(timings, fraction):
+    index = max(0, int(round(fraction * len(timings))) - 1)
+    return timings[index] * 1000
+
+
+def hit_rate(cache):
+    lookups = cache.hits + cache.misses
+    return cache.hits / lookups if lookups else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per thread')
+    parser.add_argument('--tokens', type=int, default=50,
+                        help='distinct tokens shared by the clients')
+    parser.add_argument('--modes', nargs='+', default=['uncached', 'cached'],
+                        choices=['uncached', 'cached'])
+    parser.add_argument('--http-jwks', action='store_true',
+                        help='fetch the JWKS from a localhost server')
+    args = parser.parse_args()
+
+    issuer = LocalIssuer()
+    server = None
+    if args.http_jwks:
+        server, url = serve_jwks(issuer)
+        auth.set_key_source(UrlKeySource(url))
+    else:
+        issuer.install()
+
+    tokens = [issuer.mint([PERMISSION], subject='bench|{}'.format(number))
+              for number in range(args.tokens)]
+    app = create_bench_app()
+    cache_size = auth.token_cache.max_size or args.tokens
+
+    # warm up the key store and the app before timing anything
+    run(app, '/protected', tokens, 1, len(tokens))
+    baseline, _, _ = run(app, '/open', tokens, args.threads, args.requests)
+    baseline_p50 = statistics.median(baseline) * 1000
+
+    print('{} threads x {} requests, {} tokens'.format(
+        args.threads, args.requests, args.tokens))
+    print('{:10} {:>10} {:>7} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+        'mode', 'verified/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+        'added ms', 'hit rate'))
+    print('{:10} {:>10} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9} {:>10}'.format(
+        'no auth', '-', 0, baseline_p50, percentile(baseline, 0.95),
+        percentile(baseline, 0.99), '-', '-'))
+
+    for mode in args.modes:
+        auth.token_cache.clear()
+        auth.token_cache.max_size = cache_size if mode == 'cached' else 0
+        timings, errors, seconds = run(
+            app, '/protected', tokens, args.threads, args.requests)
+        p50 = statistics.median(timings) * 1000
+        print('{:10} {:>10.1f} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} '
+              '{:>10.2%}'.format(
+                  mode, len(timings) / seconds, len(errors), p50,
+                  percentile(timings, 0.95), percentile(timings, 0.99),
+                  p50 - baseline_p50, hit_rate(auth.token_cache)))
+
+    auth.token_cache.max_size = cache_size
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+'''
+Concurrent read/write benchmark for the SQLite engine profiles
+
+Fills a bench_drink table, a copy of the drink table, with drinks, then
+runs reader threads loading the whole menu (what GET /drinks-detail does
+when the snapshot is rebuilt) against writer threads updating and inserting
+drinks (what PATCH and POST /drinks do) for a fixed time, once per SQLite
+profile in src/database/models.py. Reports operations per second, p50/p99
+latency and "database is locked" errors for each.
+
+    python -m benchmarks.bench_sqlite --readers 8 --writers 2 --duration 10
+    python -m benchmarks.bench_sqlite \
+        --database-url postgresql://localhost/coffee_bench
+'''
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import MetaData, create_engine, select
+from sqlalchemy.exc import OperationalError
+
+from src.database.models import (
+    Drink, SQLITE_PROFILES, set_sqlite_pragmas, sqlite_engine_options)
+
+COLORS = ['brown', 'white', 'blue', 'green', 'orange', 'grey']
+INGREDIENTS = ['espresso', 'milk', 'foam', 'water', 'syrup', 'chocolate']
+
+# the drink table's columns under a name of its own, so a --database-url run
+# never touches the app's drinks or the rows that reference them
+TABLE = Drink.__table__.tometadata(MetaData(), name='bench_drink')
+
+
+def recipe(generator):
+    return [{'name': generator.choice(INGREDIENTS),
+             'color': generator.choice(COLORS),
+             'parts': generator.randint(1, 3)}
+            for _ in range(generator.randint(1, 5))]
+
+
+def create_drinks(engine, count):
+    table = TABLE
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    generator = random.Random(0)
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [
+            {'title': 'Drink {}'.format(number), 'recipe': recipe(generator)}
+            for number in range(count)
+        ])
+
+
+def reader(engine, deadline, results):
+    table = TABLE
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(
+                    select([table]).order_by(table.c.id)).fetchall()
+            results['read'].append(time.perf_counter() - started)
+        except OperationalError as e:
+            results['read errors'].append(str(e.orig))
+
+
+def writer(engine, deadline, results, seed, count):
+    table = TABLE
+    generator = random.Random(seed)
+    number = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                if number % 4 == 0:
+                    connection.execute(table.insert(), {
+                        'title': 'Drink {}-{}'.format(seed, number),
+                        'recipe': recipe(generator)})
+                else:
+                    connection.execute(
+                        table.update()
+                        .where(table.c.id == generator.randint(1, count))
+                        .values(recipe=recipe(generator)))
+            results['write'].append(time.perf_counter() - started)
+        except OperationalError as e:
+            results['write errors'].append(str(e.orig))
+        number += 1
+
+
+def run(engine, args):
+    create_drinks(engine, args.drinks)
+    results = defaultdict(list)
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=reader, args=(engine, deadline, results))
+        for _ in range(args.readers)
+    ] + [
+        threading.Thread(target=writer, args=(
+            engine, deadline, results, seed, args.drinks))
+        for seed in range(args.writers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    TABLE.drop(engine)
+    return results, elapsed
+
+
+def percentile(timings, fraction):
+    if not timings:
+        return 0.0
+    index = max(0, int(round(fraction * len(timings))) - 1)
+    return timings[index] * 1000
+
+
+def report(name, results, seconds):
+    for kind in ('read', 'write'):
+        timings = sorted(results[kind])
+        errors = results[kind + ' errors']
+        print('{:12} {:6} {:>9.1f} {:>9.2f} {:>9.2f} {:>7}'.format(
+            name, kind, len(timings) / seconds, percentile(timings, 0.50),
+            percentile(timings, 0.99), len(errors)))
+        if errors:
+            print('{:12} {:6} first error: {}'.format('', '', errors[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database-url',
+                        help='benchmark this database instead of the SQLite '
+                             'profiles; the run creates, fills and finally '
+                             'drops a bench_drink table and leaves every '
+                             'other table alone')
+    parser.add_argument('--profiles', nargs='+',
+                        default=sorted(SQLITE_PROFILES),
+                        choices=sorted(SQLITE_PROFILES))
+    parser.add_argument('--drinks', type=int, default=200)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print('{} readers, {} writers, {} drinks, {:.0f}s each'.format(
+        args.readers, args.writers, args.drinks, args.duration))
+    print('{:12} {:6} {:>9} {:>9} {:>9} {:>7}'.format(
+        'profile', 'op', 'ops/s', 'p50 ms', 'p99 ms', 'errors'))
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+        report('url', *run(engine, args))
+        engine.dispose()
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles:
+            path = os.path.join(directory, profile + '.db')
+            engine = create_engine('sqlite:///' + path,
+                                   **sqlite_engine_options(profile))
+            set_sqlite_pragmas(engine, profile)
+            report(profile, *run(engine, args))
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
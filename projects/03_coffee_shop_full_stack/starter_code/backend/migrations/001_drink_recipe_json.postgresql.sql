@@ -0,0 +1,21 @@
+--
+-- Store drink.recipe as JSONB instead of JSON text in a varchar(180)
+--
+-- psql coffee_shop < migrations/001_drink_recipe_json.postgresql.sql
+--
+
+BEGIN;
+
+--
+-- Some older rows hold a single ingredient object rather than a list;
+-- wrap those so every recipe is an array
+--
+
+ALTER TABLE public.drink
+    ALTER COLUMN recipe TYPE jsonb USING (
+        CASE WHEN jsonb_typeof(recipe::jsonb) = 'object'
+             THEN jsonb_build_array(recipe::jsonb)
+             ELSE recipe::jsonb
+        END);
+
+COMMIT;
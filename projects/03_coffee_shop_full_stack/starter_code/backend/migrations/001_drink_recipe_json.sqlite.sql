@@ -0,0 +1,40 @@
+--
+-- Store drink.recipe as JSON instead of JSON text in a varchar(180)
+--
+-- sqlite3 src/database/database.db < migrations/001_drink_recipe_json.sqlite.sql
+--
+-- SQLite can not change a column type in place, so the table is rebuilt
+--
+
+PRAGMA foreign_keys = OFF;
+
+BEGIN;
+
+CREATE TABLE drink_new (
+    id INTEGER NOT NULL,
+    title VARCHAR(80),
+    recipe JSON NOT NULL CHECK (json_valid(recipe)),
+    PRIMARY KEY (id),
+    UNIQUE (title)
+);
+
+--
+-- Some older rows hold a single ingredient object rather than a list;
+-- wrap those so every recipe is an array
+--
+
+INSERT INTO drink_new (id, title, recipe)
+    SELECT id, title,
+           CASE WHEN json_type(recipe) = 'object'
+                THEN json_array(json(recipe))
+                ELSE json(recipe)
+           END
+    FROM drink;
+
+DROP TABLE drink;
+
+ALTER TABLE drink_new RENAME TO drink;
+
+COMMIT;
+
+PRAGMA foreign_keys = ON;
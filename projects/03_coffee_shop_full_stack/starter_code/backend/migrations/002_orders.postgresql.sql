@@ -0,0 +1,28 @@
+--
+-- Orders and the barista queue
+--
+-- psql coffee_shop < migrations/002_orders.postgresql.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.orders (
+    id serial PRIMARY KEY,
+    drink_id integer REFERENCES public.drink (id) ON DELETE SET NULL,
+    customer varchar(80),
+    priority integer NOT NULL DEFAULT 0,
+    status varchar(16) NOT NULL DEFAULT 'queued',
+    barista varchar(120),
+    created_at timestamp NOT NULL,
+    claimed_at timestamp,
+    updated_at timestamp NOT NULL
+);
+
+--
+-- Serves the barista queue: queued orders by priority, then arrival
+--
+
+CREATE INDEX IF NOT EXISTS orders_status_priority_id_idx
+    ON public.orders (status, priority DESC, id);
+
+COMMIT;
@@ -0,0 +1,30 @@
+--
+-- Orders and the barista queue
+--
+-- sqlite3 src/database/database.db < migrations/002_orders.sqlite.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER NOT NULL,
+    drink_id INTEGER,
+    customer VARCHAR(80),
+    priority INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    barista VARCHAR(120),
+    created_at DATETIME NOT NULL,
+    claimed_at DATETIME,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY (drink_id) REFERENCES drink (id) ON DELETE SET NULL
+);
+
+--
+-- Serves the barista queue: queued orders by priority, then arrival
+--
+
+CREATE INDEX IF NOT EXISTS orders_status_priority_id_idx
+    ON orders (status, priority DESC, id);
+
+COMMIT;
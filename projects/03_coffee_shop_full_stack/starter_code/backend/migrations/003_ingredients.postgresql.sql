@@ -0,0 +1,47 @@
+--
+-- Ingredient index for searching drinks by ingredient
+--
+-- psql coffee_shop < migrations/003_ingredients.postgresql.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.ingredients (
+    id serial PRIMARY KEY,
+    drink_id integer NOT NULL
+        REFERENCES public.drink (id) ON DELETE CASCADE,
+    name varchar NOT NULL,
+    color varchar,
+    parts double precision NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_ingredients_drink_id
+    ON public.ingredients (drink_id);
+CREATE INDEX IF NOT EXISTS ingredients_name_color_drink_idx
+    ON public.ingredients (name, color, drink_id);
+CREATE INDEX IF NOT EXISTS ingredients_color_drink_idx
+    ON public.ingredients (color, drink_id);
+
+--
+-- Fill it from the existing recipes; the app keeps it in step from here
+--
+
+DELETE FROM public.ingredients;
+
+INSERT INTO public.ingredients (drink_id, name, color, parts)
+    SELECT drink.id,
+           lower(trim(coalesce(r.value ->> 'name', ''))),
+           nullif(lower(trim(coalesce(r.value ->> 'color', ''))), ''),
+           -- like Ingredient._parts: anything that is not a number is 0
+           CASE WHEN trim(r.value ->> 'parts')
+                     ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+                THEN trim(r.value ->> 'parts')::double precision
+                ELSE 0
+           END
+    FROM public.drink,
+         jsonb_array_elements(drink.recipe) AS r (value)
+    WHERE jsonb_typeof(r.value) = 'object';
+
+COMMIT;
+
+ANALYZE public.ingredients;
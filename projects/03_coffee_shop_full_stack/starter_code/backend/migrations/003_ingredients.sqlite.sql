@@ -0,0 +1,42 @@
+--
+-- Ingredient index for searching drinks by ingredient
+--
+-- sqlite3 src/database/database.db < migrations/003_ingredients.sqlite.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ingredients (
+    id INTEGER NOT NULL,
+    drink_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    color VARCHAR,
+    parts FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY (drink_id) REFERENCES drink (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS ix_ingredients_drink_id
+    ON ingredients (drink_id);
+CREATE INDEX IF NOT EXISTS ingredients_name_color_drink_idx
+    ON ingredients (name, color, drink_id);
+CREATE INDEX IF NOT EXISTS ingredients_color_drink_idx
+    ON ingredients (color, drink_id);
+
+--
+-- Fill it from the existing recipes; the app keeps it in step from here
+--
+
+DELETE FROM ingredients;
+
+INSERT INTO ingredients (drink_id, name, color, parts)
+    SELECT drink.id,
+           lower(trim(coalesce(json_extract(r.value, '$.name'), ''))),
+           nullif(lower(trim(coalesce(json_extract(r.value, '$.color'), ''))), ''),
+           coalesce(CAST(json_extract(r.value, '$.parts') AS REAL), 0)
+    FROM drink, json_each(drink.recipe) AS r
+    WHERE r.type = 'object';
+
+COMMIT;
+
+ANALYZE;
@@ -0,0 +1,16 @@
+--
+-- Committed drink changes, polled by every process for the menu stream
+--
+-- psql coffee_shop < migrations/004_drink_events.postgresql.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.drink_events (
+    id serial PRIMARY KEY,
+    type varchar(32) NOT NULL,
+    drink jsonb NOT NULL,
+    created_at timestamp NOT NULL
+);
+
+COMMIT;
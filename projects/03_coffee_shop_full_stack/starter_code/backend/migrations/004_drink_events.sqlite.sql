@@ -0,0 +1,17 @@
+--
+-- Committed drink changes, polled by every process for the menu stream
+--
+-- sqlite3 src/database/database.db < migrations/004_drink_events.sqlite.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS drink_events (
+    id INTEGER NOT NULL,
+    type VARCHAR(32) NOT NULL,
+    drink JSON NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+
+COMMIT;
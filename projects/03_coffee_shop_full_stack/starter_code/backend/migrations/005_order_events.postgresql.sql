@@ -0,0 +1,18 @@
+--
+-- Committed order changes, polled by every process for the order events
+-- long-poll and read for the order metrics
+--
+-- psql coffee_shop < migrations/005_order_events.postgresql.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.order_events (
+    id serial PRIMARY KEY,
+    type varchar(32) NOT NULL,
+    "order" jsonb NOT NULL,
+    wait double precision,
+    created_at timestamp NOT NULL
+);
+
+COMMIT;
@@ -0,0 +1,19 @@
+--
+-- Committed order changes, polled by every process for the order events
+-- long-poll and read for the order metrics
+--
+-- sqlite3 src/database/database.db < migrations/005_order_events.sqlite.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER NOT NULL,
+    type VARCHAR(32) NOT NULL,
+    "order" JSON NOT NULL,
+    wait FLOAT,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+
+COMMIT;
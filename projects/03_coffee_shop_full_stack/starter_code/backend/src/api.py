@@ -1,11 +1,18 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, jsonify, abort, current_app
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
+from .database.models import (
+    db_drop_and_create_all, setup_db, db, Drink, Ingredient, Order)
+from .auth.auth import AuthError, requires_auth, check_permissions
+from .menu import menu_snapshot, menu_response
+from .batch import DrinkBatch, BATCH_MAX_OPERATIONS
+from .stream import drink_stream, drink_feed, stream_clients
+from .orders import (
+    TRANSITIONS, ORDER_WAIT_TIMEOUT, create_order, claim_next_order,
+    order_events, order_feed, order_metrics, order_worker)
 
 app = Flask(__name__)
 setup_db(app)
@@ -19,6 +26,18 @@ CORS(app)
 '''
 # db_drop_and_create_all()
 
+'''
+the drink and order event feeds poll for changes committed by any
+process; they are started in each worker on its first request
+'''
+
+
+@app.before_request
+def start_event_feeds():
+    drink_feed.start(app)
+    order_feed.start(app)
+
+
 # ROUTES
 '''
 @TODO implement endpoint
@@ -28,27 +47,85 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where
         drinks is the list of drinks
         or appropriate status code indicating reason for failure
+    the body comes from the in-memory menu snapshot, see menu.py
 '''
 
 
 @app.route('/drinks', methods=['GET'])
 def get_drinks():
-    try:
-        drinks = [drink.short() for drink in Drink.query.all()]
-
-        if len(drinks):
-            return jsonify({
-                'status_code': 200,
-                'success': True,
-                'drinks': drinks
-            })
-        else:
-            abort(422)
+    ingredient = request.args.get('ingredient', '').strip().lower()
+    color = request.args.get('color', '').strip().lower()
+    if ingredient or color:
+        return get_drinks_with_ingredient(ingredient, color)
 
+    try:
+        menu = menu_snapshot.get()
     except Exception as e:
         print(e)
         abort(500)
 
+    if not menu.count:
+        abort(422)
+
+    return menu_response(menu.short, menu.short_etag)
+
+
+'''
+GET /drinks?ingredient=<name>&color=<color>
+    the drinks with an ingredient of that name and/or color (both match
+    the same ingredient, case insensitive), in the short form
+    served from the ingredients index rather than the recipes
+'''
+
+
+def get_drinks_with_ingredient(ingredient, color):
+    matches = db.session.query(Ingredient.drink_id)
+    if ingredient:
+        matches = matches.filter(Ingredient.name == ingredient)
+    if color:
+        matches = matches.filter(Ingredient.color == color)
+
+    drinks = Drink.query.filter(Drink.id.in_(matches.subquery())) \
+        .order_by(Drink.id).all()
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'drinks': [drink.short() for drink in drinks]
+    })
+
+
+'''
+GET /drinks/ingredients
+    a public endpoint
+    every ingredient on the menu with its total parts across all drinks
+    and the number of drinks using it, most used first, added up in SQL
+'''
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+@app.route('/drinks/ingredients', methods=['GET'])
+def get_ingredient_totals():
+    totals = db.session.query(
+        Ingredient.name,
+        db.func.sum(Ingredient.parts).label('parts'),
+        db.func.count(db.distinct(Ingredient.drink_id))) \
+        .group_by(Ingredient.name) \
+        .order_by(db.desc('parts'), Ingredient.name).all()
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'ingredients': [{
+            'name': name,
+            'parts': _number(parts),
+            'drinks': drinks
+        } for name, parts, drinks in totals]
+    })
+
 
 '''
 @TODO implement endpoint
@@ -58,23 +135,20 @@ def get_drinks():
     returns status code 200 and json {"success": True, "drinks": drinks} where
         drinks is the list of drinks
         or appropriate status code indicating reason for failure
+    the body comes from the in-memory menu snapshot, see menu.py
 '''
 
 
 @app.route('/drinks-detail', methods=['GET'])
 @requires_auth('get:drinks-detail')
 def get_drinks_detail(f):
-    drinks = [drink.long() for drink in Drink.query.all()]
+    menu = menu_snapshot.get()
 
-    if len(drinks):
-        return jsonify({
-            'status': 200,
-            'success': True,
-            'drinks': drinks
-        })
-    else:
+    if not menu.count:
         abort(422)
 
+    return menu_response(menu.long, menu.long_etag, public=False)
+
 
 '''
 @TODO implement endpoint
@@ -95,7 +169,7 @@ def create_drink(form):
     try:
         data = request.get_json()
         title = data.get('title')
-        recipe = json.dumps(data.get('recipe'))
+        recipe = data.get('recipe')
         drink = Drink(title=title, recipe=recipe)
 
         drink.insert()
@@ -135,7 +209,7 @@ def update_drink(f, id):
 
         if drink:
             drink.title = data.get('title')
-            drink.recipe = json.dumps(data.get('recipe'))
+            drink.recipe = data.get('recipe')
             drink.update()
 
             return jsonify({
@@ -189,6 +263,283 @@ def delete_drink(f, id):
         abort(422)
 
 
+'''
+GET /drinks/stream
+    a public Server-Sent Events stream of committed menu changes:
+    drink-created, drink-updated (both with the short() form) and
+    drink-deleted (with the id)
+    a reconnecting client sends Last-Event-ID (or ?last_event_id=) and
+    gets the events it missed; if they are no longer available it gets a
+    reset event and should reload GET /drinks
+    returns 503 when STREAM_MAX_CLIENTS streams are already open
+'''
+
+
+@app.route('/drinks/stream', methods=['GET'])
+def stream_drinks():
+    if not stream_clients.acquire():
+        response = jsonify({
+            'success': False,
+            'error': 503,
+            'message': 'too many open streams'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID') or \
+        request.args.get('last_event_id')
+    return drink_stream(last_event_id)
+
+
+'''
+POST /drinks/batch
+    applies a list of create, update and delete operations in one round
+    trip: the token is verified once, then checked for the permission of
+    every kind of operation in the batch (post:drinks, patch:drinks,
+    delete:drinks)
+    body {"operations": [{"op": "create", "title": ..., "recipe": [...]},
+                         {"op": "update", "id": 1, "recipe": [...]},
+                         {"op": "delete", "id": 2}],
+          "atomic": true}
+    atomic (the default): if any operation is invalid nothing is applied
+        and the response is a 422 with the per-operation results; valid
+        operations are reported as skipped
+    atomic false: the valid operations are applied, the invalid ones are
+        reported
+    everything applied runs in one transaction
+    returns status code 200 and json {"success": True, "results": results,
+        "drinks": drinks} where drinks holds the long() form of every
+        created or updated drink
+'''
+
+
+@app.route('/drinks/batch', methods=['POST'])
+@requires_auth()
+def batch_drinks(payload):
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    atomic = data.get('atomic', True)
+
+    if not isinstance(operations, list) or not operations or \
+            len(operations) > BATCH_MAX_OPERATIONS:
+        abort(400)
+
+    batch = DrinkBatch(operations)
+    for permission in sorted(batch.permissions()):
+        check_permissions(permission, payload)
+
+    valid = batch.validate()
+    if atomic and len(valid) < len(operations):
+        db.session.rollback()
+        return jsonify({
+            'status_code': 422,
+            'success': False,
+            'results': [result or {'index': index, 'success': False,
+                                   'skipped': True}
+                        for index, result in enumerate(batch.results)]
+        }), 422
+
+    try:
+        results = batch.apply(valid)
+    except Exception as e:
+        print(e)
+        abort(422)
+
+    return jsonify({
+        'status_code': 200,
+        'success': len(results) == len(operations),
+        'results': batch.results,
+        'drinks': [result['drink'] for result in results
+                   if result['drink'] is not None]
+    })
+
+
+# Orders
+'''
+POST /orders
+    a public endpoint; places an order for one drink
+    body {"drink_id": id, "customer": name}
+    returns status code 200 and json {"success": True, "order": order}
+        or 404 if the drink does not exist
+'''
+
+
+@app.route('/orders', methods=['POST'])
+def place_order():
+    data = request.get_json(silent=True) or {}
+    drink_id = data.get('drink_id')
+    customer = data.get('customer')
+
+    if not isinstance(drink_id, int) or \
+            (customer is not None and not isinstance(customer, str)):
+        abort(400)
+    if Drink.query.get(drink_id) is None:
+        abort(404)
+
+    order = create_order(drink_id, customer and customer[:80])
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'order': order.format()
+    })
+
+
+'''
+GET /orders/<id>
+    a public endpoint; lets a customer follow their order
+'''
+
+
+@app.route('/orders/<int:order_id>', methods=['GET'])
+def get_order(order_id):
+    order = Order.query.get(order_id)
+    if order is None:
+        abort(404)
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'order': order.format()
+    })
+
+
+'''
+GET /orders/queue
+    requires the 'get:orders' permission
+    the queued orders in the order baristas will get them
+'''
+
+
+@app.route('/orders/queue', methods=['GET'])
+@requires_auth('get:orders')
+def get_order_queue(payload):
+    orders = Order.query.filter(Order.status == 'queued') \
+        .order_by(Order.priority.desc(), Order.id).limit(100).all()
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'orders': [order.format() for order in orders]
+    })
+
+
+'''
+POST /orders/claim
+    requires the 'patch:orders' permission
+    claims the next order in the queue for the calling barista
+    returns status code 200 and json {"success": True, "order": order}
+        or 404 if no order is waiting
+'''
+
+
+@app.route('/orders/claim', methods=['POST'])
+@requires_auth('patch:orders')
+def claim_order(payload):
+    order = claim_next_order(payload.get('sub'))
+    if order is None:
+        abort(404)
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'order': order.format()
+    })
+
+
+'''
+PATCH /orders/<id>
+    requires the 'patch:orders' permission
+    body {"status": status} and/or {"priority": number}
+    the change is checked against the order's current status, then applied
+    by the order worker pool
+    returns status code 202 and json {"success": True, "order": id}
+        or 422 if the order can not move to that status
+'''
+
+
+@app.route('/orders/<int:order_id>', methods=['PATCH'])
+@requires_auth('patch:orders')
+def update_order(payload, order_id):
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    priority = data.get('priority')
+
+    if status is None and priority is None:
+        abort(400)
+    if priority is not None and not isinstance(priority, int):
+        abort(400)
+
+    order = Order.query.get(order_id)
+    if order is None:
+        abort(404)
+    if status is not None and status not in TRANSITIONS[order.status]:
+        abort(422)
+    if status is None and order.status != 'queued':
+        abort(422)
+
+    order_worker.submit(current_app._get_current_object(), order_id,
+                        status, priority)
+
+    return jsonify({
+        'status_code': 202,
+        'success': True,
+        'order': order_id
+    }), 202
+
+
+'''
+GET /orders/events?after=<id>&timeout=<seconds>
+    requires the 'get:orders' permission
+    long-polls for order events after the event id `after`; answers as
+    soon as there is one, or with an empty list after timeout seconds
+    (at most ORDER_WAIT_TIMEOUT)
+    pass the returned last_id as `after` on the next call
+'''
+
+
+@app.route('/orders/events', methods=['GET'])
+@requires_auth('get:orders')
+def wait_for_order_events(payload):
+    after = request.args.get('after', 0, type=int)
+    timeout = request.args.get('timeout', ORDER_WAIT_TIMEOUT, type=float)
+    events, last_id = order_events.wait(
+        after, min(max(timeout, 0), ORDER_WAIT_TIMEOUT))
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'events': events,
+        'last_id': last_id
+    })
+
+
+'''
+GET /orders/metrics
+    requires the 'get:orders' permission
+    queue depth, orders per status, order rates and claim waits, across
+    all workers
+'''
+
+
+@app.route('/orders/metrics', methods=['GET'])
+@requires_auth('get:orders')
+def get_order_metrics(payload):
+    statuses = dict(db.session.query(Order.status, db.func.count(Order.id))
+                    .group_by(Order.status).all())
+
+    return jsonify({
+        'status_code': 200,
+        'success': True,
+        'queue_depth': statuses.get('queued', 0),
+        'statuses': statuses,
+        'orders': order_metrics(),
+        # the worker pool of the process that answered
+        'worker': order_worker.stats()
+    })
+
+
 # Error Handling
 '''
 Example error handling for unprocessable entity
@@ -211,6 +562,15 @@ Example error handling for unprocessable entity
 '''
 
 
+@app.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+        "success": False,
+        "error": 400,
+        "message": "bad request"
+    }), 400
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
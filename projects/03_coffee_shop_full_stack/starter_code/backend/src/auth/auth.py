@@ -1,13 +1,19 @@
-import json
+import os
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSKeyStore, JWKSFetchError, UrlKeySource, FileKeySource
+from .token_cache import TokenCache, TOKEN_CACHE_SIZE
 
 
 AUTH0_DOMAIN = 'blackmer.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'http://localhost:5000'
+JWKS_URL = os.getenv('JWKS_URL',
+                     f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+JWKS_FILE = os.getenv('JWKS_FILE')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', TOKEN_CACHE_SIZE))
 
 # AuthError Exception
 '''
@@ -22,6 +28,35 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+# Signing keys
+'''
+key_store
+    the signing keys, fetched from JWKS_URL (or read from JWKS_FILE) and
+    cached by kid, so verifying a token does not fetch the JWKS every time
+    set_key_source() swaps the source, e.g. for a StaticKeySource in
+    offline tests
+'''
+
+key_store = JWKSKeyStore(
+    FileKeySource(JWKS_FILE) if JWKS_FILE else UrlKeySource(JWKS_URL))
+
+
+def set_key_source(source):
+    key_store.source = source
+    key_store.clear()
+    token_cache.clear()
+
+
+# Verified tokens
+'''
+token_cache
+    payloads of tokens that already passed verify_decode_jwt, kept until
+    the token expires; TOKEN_CACHE_SIZE=0 turns it off
+'''
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
 # Auth Header
 
 '''
@@ -85,6 +120,8 @@ def check_permissions(permission, payload):
 
     it should be an Auth0 token with key id (kid)
     it should verify the token using Auth0 /.well-known/jwks.json
+        the keys come from key_store; an unknown kid makes it refresh the
+        keys, at most once per min_refresh_interval
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
@@ -96,27 +133,22 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-
     unverified_header = jwt.get_unverified_header(token)
 
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = key_store.get_key(unverified_header['kid'])
+    except JWKSFetchError as e:
+        print(e)
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
 
     if rsa_key:
         try:
@@ -163,16 +195,28 @@ def verify_decode_jwt(token):
     it should use the check_permissions method validate claims and check the
     requested permission return the decorator which passes the decoded payload
     to the decorated method
+        a token seen before is served from token_cache instead of being
+        verified again
 '''
 
 
+def verified_payload(token):
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_decode_jwt(token)
+        token_cache.put(token, payload)
+    return payload
+
+
 def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            payload = verified_payload(token)
+            # without a permission the view checks the payload itself
+            if permission:
+                check_permissions(permission, payload)
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,175 @@
+'''
+Local token issuer
+
+Stands in for the Auth0 tenant when there is no network or for load tests:
+generates an RSA keypair, serves the public key as a JWKS document and mints
+RS256 tokens with any permissions, signed so that verify_decode_jwt accepts
+them.
+
+    python -m src.auth.issuer --jwks-file /tmp/jwks.json \
+        --key-file /tmp/issuer.pem get:drinks-detail post:drinks
+
+prints a token; run the server with JWKS_FILE=/tmp/jwks.json to accept it.
+'''
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jose import jwt
+
+from .auth import AUTH0_DOMAIN, API_AUDIENCE, set_key_source
+from .jwks import StaticKeySource
+
+ISSUER_KEY_BITS = 2048
+TOKEN_TTL = 60 * 60
+
+
+def _b64(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _generate_key(bits):
+    # pycryptodome comes with python-jose-cryptodome, python-rsa with
+    # python-jose; either can make the keypair
+    try:
+        from Crypto.PublicKey import RSA
+    except ImportError:
+        import rsa
+        public, private = rsa.newkeys(bits)
+        return private.save_pkcs1().decode('ascii'), public.n, public.e
+
+    key = RSA.generate(bits)
+    return key.export_key().decode('ascii'), key.n, key.e
+
+
+def _load_key(pem):
+    try:
+        from Crypto.PublicKey import RSA
+    except ImportError:
+        import rsa
+        private = rsa.PrivateKey.load_pkcs1(pem.encode('ascii'))
+        return pem, private.n, private.e
+
+    key = RSA.import_key(pem)
+    return pem, key.n, key.e
+
+
+'''
+LocalIssuer
+    @INPUTS
+        kid: the key id put in the JWKS and in every token header
+        bits: size of the generated key
+        pem: an existing private key to use instead of generating one
+    the tokens carry the issuer and audience verify_decode_jwt expects
+'''
+
+
+class LocalIssuer:
+    def __init__(self, kid='local-issuer', bits=ISSUER_KEY_BITS, pem=None):
+        self.kid = kid
+        self.issuer = 'https://' + AUTH0_DOMAIN + '/'
+        self.audience = API_AUDIENCE
+        if pem is None:
+            self.pem, n, e = _generate_key(bits)
+        else:
+            self.pem, n, e = _load_key(pem)
+        self._public = {'kty': 'RSA', 'kid': kid, 'use': 'sig',
+                        'alg': 'RS256', 'n': _b64(n), 'e': _b64(e)}
+
+    def jwks(self):
+        return {'keys': [dict(self._public)]}
+
+    def key_source(self):
+        return StaticKeySource(self.jwks())
+
+    '''
+    install()
+        makes requires_auth in this process trust the issuer's key
+    '''
+
+    def install(self):
+        set_key_source(self.key_source())
+        return self
+
+    def mint(self, permissions=(), ttl=TOKEN_TTL, subject='local|user',
+             **claims):
+        now = int(time.time())
+        payload = {
+            'iss': self.issuer,
+            'sub': subject,
+            'aud': self.audience,
+            'iat': now,
+            'exp': now + ttl,
+            'permissions': list(permissions)
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+
+'''
+serve_jwks(issuer, host, port)
+    serves the issuer's JWKS at /.well-known/jwks.json on a background
+    thread; returns the server and the URL to set as JWKS_URL
+    call server.shutdown() to stop it
+'''
+
+
+def serve_jwks(issuer, host='127.0.0.1', port=0):
+    document = json.dumps(issuer.jwks()).encode('utf-8')
+
+    class JWKSHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/.well-known/jwks.json':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(document)))
+            self.end_headers()
+            self.wfile.write(document)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), JWKSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://{}:{}/.well-known/jwks.json'.format(*server.server_address)
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('permissions', nargs='*')
+    parser.add_argument('--key-file',
+                        help='private key to reuse; created if missing')
+    parser.add_argument('--jwks-file', help='write the JWKS document here')
+    parser.add_argument('--ttl', type=int, default=TOKEN_TTL)
+    parser.add_argument('--subject', default='local|user')
+    args = parser.parse_args()
+
+    pem = None
+    if args.key_file:
+        try:
+            with open(args.key_file) as key_file:
+                pem = key_file.read()
+        except FileNotFoundError:
+            pass
+
+    issuer = LocalIssuer(pem=pem)
+    if args.key_file and pem is None:
+        with open(args.key_file, 'w') as key_file:
+            key_file.write(issuer.pem)
+    if args.jwks_file:
+        with open(args.jwks_file, 'w') as jwks_file:
+            json.dump(issuer.jwks(), jwks_file)
+
+    print(issuer.mint(args.permissions, ttl=args.ttl, subject=args.subject))
+
+
+if __name__ == '__main__':
+    main()
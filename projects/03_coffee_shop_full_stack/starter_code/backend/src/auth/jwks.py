@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+JWKS_TTL = 10 * 60
+JWKS_REFRESH_AHEAD = 60
+JWKS_MIN_REFRESH_INTERVAL = 30
+JWKS_FETCH_TIMEOUT = 5
+
+'''
+JWKSFetchError Exception
+raised when no signing keys can be fetched and none were fetched before
+'''
+
+
+class JWKSFetchError(Exception):
+    pass
+
+
+# Key sources
+'''
+Key sources
+    anything with a fetch() method returning a JWKS document
+    ({'keys': [...]}) can be used by JWKSKeyStore
+'''
+
+
+class UrlKeySource:
+    def __init__(self, url, timeout=JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class FileKeySource:
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path) as jwks_file:
+            return json.load(jwks_file)
+
+
+class StaticKeySource:
+    def __init__(self, jwks):
+        self.jwks = jwks
+
+    def fetch(self):
+        return self.jwks
+
+
+'''
+JWKSKeyStore
+    caches the RSA signing keys from a key source by kid
+    @INPUTS
+        source: a key source
+        ttl: seconds the fetched keys are considered fresh
+        refresh_ahead: within this many seconds of the ttl running out, a
+            key lookup starts a background refresh and keeps serving the
+            cached keys meanwhile
+        min_refresh_interval: the source is asked at most once per this
+            many seconds, whether for an unknown kid, a refresh ahead of
+            the ttl or a first fetch that keeps failing, so tokens with
+            made-up kids or a source that is down cannot hammer it
+    a failed refresh keeps the last good keys
+'''
+
+
+class JWKSKeyStore:
+    def __init__(self, source, ttl=JWKS_TTL,
+                 refresh_ahead=JWKS_REFRESH_AHEAD,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL):
+        self.source = source
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_interval = min_refresh_interval
+        self.fetches = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._first_fetch = threading.Lock()
+        self._keys = None
+        self._expires = 0
+        self._last_attempt = None
+        self._refreshing = False
+
+    @staticmethod
+    def _rsa_keys(jwks):
+        return {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+            for key in jwks['keys']
+            if key.get('kty') == 'RSA'
+        }
+
+    def refresh(self):
+        with self._lock:
+            self._last_attempt = time.monotonic()
+        try:
+            keys = self._rsa_keys(self.source.fetch())
+        except Exception as e:
+            print(e)
+            with self._lock:
+                self.failures += 1
+                self._refreshing = False
+            return False
+
+        with self._lock:
+            self.fetches += 1
+            self._keys = keys
+            self._expires = time.monotonic() + self.ttl
+            self._refreshing = False
+        return True
+
+    def _may_refresh(self, now):
+        return (self._last_attempt is None or
+                now - self._last_attempt >= self.min_refresh_interval)
+
+    # claims the next attempt: the attempt time is recorded before the
+    # fetch starts, so concurrent lookups see it and do not start their own
+    def _claim_refresh(self, now):
+        with self._lock:
+            if self._refreshing or not self._may_refresh(now):
+                return False
+            self._last_attempt = now
+            self._refreshing = True
+            return True
+
+    def _refresh_in_background(self, now):
+        if self._claim_refresh(now):
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def _refresh_now(self, now):
+        return self._claim_refresh(now) and self.refresh()
+
+    '''
+    get_key(kid)
+        returns the RSA key dict for kid, or None if the source does not
+        have it
+        raises JWKSFetchError if keys have never been fetched successfully
+    '''
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if self._keys is None:
+            # lookups arriving while the first fetch runs wait for it
+            with self._first_fetch:
+                if self._keys is None and not self._refresh_now(now):
+                    raise JWKSFetchError('Unable to fetch the signing keys.')
+
+        key = self._keys.get(kid)
+
+        if key is None:
+            if self._refresh_now(now):
+                key = self._keys.get(kid)
+        elif now >= self._expires - self.refresh_ahead:
+            self._refresh_in_background(now)
+
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._expires = 0
+            self._last_attempt = None
+            self._refreshing = False
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_CACHE_SIZE = 1024
+
+'''
+TokenCache
+    a bounded LRU cache of verified token payloads, so the signature of a
+    token is checked once rather than on every request
+    entries are keyed by a SHA-256 of the token and are only served until
+    the token's exp claim; tokens without exp are never cached
+    there is no revocation: a cached token is accepted until its exp, as an
+    uncached one would be, since a signed JWT stays valid until then
+    a max_size of 0 turns the cache off
+'''
+
+
+class TokenCache:
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        if not self.max_size:
+            return None
+
+        key = self._key(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._payloads[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._payloads.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token, payload):
+        expires = payload.get('exp')
+        if not self.max_size or not isinstance(expires, (int, float)):
+            return
+
+        key = self._key(token)
+
+        with self._lock:
+            self._payloads[key] = (expires, payload)
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+            self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,181 @@
+from .database.models import db, Drink
+
+BATCH_MAX_OPERATIONS = 200
+
+'''
+OPERATIONS
+    the batch operations and the permission each one needs
+'''
+
+OPERATIONS = {
+    'create': 'post:drinks',
+    'update': 'patch:drinks',
+    'delete': 'delete:drinks'
+}
+
+
+def _recipe_error(recipe):
+    if isinstance(recipe, dict):
+        recipe = [recipe]
+    if not isinstance(recipe, list) or not recipe:
+        return 'recipe must be a non-empty list of ingredients'
+    for ingredient in recipe:
+        if not isinstance(ingredient, dict) or \
+                not {'name', 'color', 'parts'} <= ingredient.keys():
+            return 'each ingredient needs a name, color and parts'
+    return None
+
+
+def _title_error(title):
+    if not isinstance(title, str) or not title.strip():
+        return 'title must be a non-empty string'
+    if len(title) > 80:
+        return 'title must be at most 80 characters'
+    return None
+
+
+'''
+DrinkBatch
+    a list of create, update and delete operations on drinks, checked
+    against the database up front with two queries (the drinks they name
+    and the titles they use) and then applied in one transaction
+    @INPUTS
+        operations: [{"op": "create", "title": ..., "recipe": [...]},
+                     {"op": "update", "id": 1, "title": ..., "recipe": ...},
+                     {"op": "delete", "id": 2}]
+'''
+
+
+class DrinkBatch:
+    def __init__(self, operations):
+        self.operations = operations
+        self.results = [None] * len(operations)
+
+    def permissions(self):
+        return {OPERATIONS[operation['op']] for operation in self.operations
+                if isinstance(operation, dict) and
+                operation.get('op') in OPERATIONS}
+
+    def _fail(self, index, operation, error):
+        self.results[index] = {
+            'index': index,
+            'op': operation.get('op') if isinstance(operation, dict) else None,
+            'id': operation.get('id') if isinstance(operation, dict) else None,
+            'success': False,
+            'error': error
+        }
+
+    '''
+    validate()
+        fills in an error result for every operation that can not be
+        applied, simulating the batch in order so that, e.g., a title freed
+        by an earlier rename or delete can be reused later in the batch
+        returns the valid operations as (index, operation, drink) tuples
+    '''
+
+    def validate(self):
+        ids = {operation.get('id') for operation in self.operations
+               if isinstance(operation, dict) and
+               isinstance(operation.get('id'), int)}
+        titles = {operation.get('title') for operation in self.operations
+                  if isinstance(operation, dict) and
+                  isinstance(operation.get('title'), str)}
+
+        drinks = {drink.id: drink for drink in
+                  Drink.query.filter(Drink.id.in_(ids)).all()} if ids else {}
+        taken = dict(db.session.query(Drink.title, Drink.id)
+                     .filter(Drink.title.in_(titles)).all()) if titles else {}
+        for drink in drinks.values():
+            taken[drink.title] = drink.id
+
+        valid = []
+        deleted = set()
+        for index, operation in enumerate(self.operations):
+            if not isinstance(operation, dict) or \
+                    operation.get('op') not in OPERATIONS:
+                self._fail(index, operation,
+                           'op must be one of create, update, delete')
+                continue
+
+            op = operation['op']
+            drink = None
+            if op != 'create':
+                drink = drinks.get(operation.get('id'))
+                if drink is None or drink.id in deleted:
+                    self._fail(index, operation, 'drink not found')
+                    continue
+
+            error = None
+            if op == 'create' or 'title' in operation:
+                error = _title_error(operation.get('title'))
+                if error is None:
+                    owner = taken.get(operation['title'])
+                    if owner is not None and \
+                            (drink is None or owner != drink.id):
+                        error = 'title already in use'
+            if error is None and (op == 'create' or 'recipe' in operation):
+                error = _recipe_error(operation.get('recipe'))
+            if error is None and op == 'update' and \
+                    'title' not in operation and 'recipe' not in operation:
+                error = 'nothing to update'
+            if error is not None:
+                self._fail(index, operation, error)
+                continue
+
+            if op == 'delete':
+                deleted.add(drink.id)
+                taken.pop(drink.title, None)
+            elif 'title' in operation:
+                if drink is not None:
+                    taken.pop(drink.title, None)
+                # creates get their id at flush; -1 - index stands in
+                taken[operation['title']] = \
+                    drink.id if drink is not None else -1 - index
+
+            valid.append((index, operation, drink))
+
+        return valid
+
+    '''
+    apply(valid)
+        applies the valid operations in one transaction and fills in their
+        results with the long() form of each drink
+    '''
+
+    def apply(self, valid):
+        touched = []
+        try:
+            for index, operation, drink in valid:
+                op = operation['op']
+                if op == 'create':
+                    drink = Drink(title=operation['title'],
+                                  recipe=operation['recipe'])
+                    db.session.add(drink)
+                elif op == 'update':
+                    if 'title' in operation:
+                        drink.title = operation['title']
+                    if 'recipe' in operation:
+                        drink.recipe = operation['recipe']
+                else:
+                    db.session.delete(drink)
+                # flush each operation on its own so the statements run in
+                # batch order: a title freed by a rename or delete must be
+                # released before a later create takes it
+                db.session.flush()
+                touched.append((index, op, drink))
+
+            results = [{
+                'index': index,
+                'op': op,
+                'id': drink.id,
+                'success': True,
+                'drink': None if op == 'delete' else drink.long()
+            } for index, op, drink in touched]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for result in results:
+            self.results[result['index']] = result
+        return results
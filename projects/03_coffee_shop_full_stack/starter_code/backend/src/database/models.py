@@ -1,5 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer
+from datetime import datetime
+from sqlalchemy import (
+    Column, String, Integer, Float, JSON, DateTime, ForeignKey, Index, event,
+    inspect)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import validates
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -8,20 +15,105 @@ project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(
     os.path.join(project_dir, database_filename))
 
+'''
+DATABASE_URL
+    the sqlite file above unless set, e.g. to
+    postgresql://localhost/coffee_shop
+SQLITE_PROFILE
+    'performance' (the default) or 'default', see SQLITE_PROFILES
+'''
+
+DATABASE_URL = os.getenv('DATABASE_URL', database_path)
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'performance')
+
+'''
+SQLITE_PROFILES
+    engine settings for sqlite files
+    default: what SQLite and Flask-SQLAlchemy do out of the box - rollback
+        journal, a fresh connection per checkout
+    performance: WAL so readers and the writer do not block each other,
+        synchronous=NORMAL (safe with WAL, no fsync per commit), a busy
+        timeout so writers queue up instead of failing with "database is
+        locked", a memory mapped file and a larger page cache, and a pool
+        of connections that keeps them all warm
+'''
+
+SQLITE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    'performance': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024
+        },
+        'engine_options': {
+            'poolclass': QueuePool,
+            'pool_size': 8,
+            'max_overflow': 8,
+            'connect_args': {'check_same_thread': False}
+        }
+    }
+}
+
 db = SQLAlchemy()
 
+
+def sqlite_engine_options(profile=SQLITE_PROFILE):
+    options = dict(SQLITE_PROFILES[profile]['engine_options'])
+    if 'connect_args' in options:
+        options['connect_args'] = dict(options['connect_args'])
+    return options
+
+
+'''
+set_sqlite_pragmas(engine, profile)
+    runs the profile's PRAGMAs on every new connection of engine
+'''
+
+
+def set_sqlite_pragmas(engine, profile=SQLITE_PROFILE):
+    pragmas = SQLITE_PROFILES[profile]['pragmas']
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    sqlite files get the SQLITE_PROFILE settings; any other database_url
+    (postgres) uses the SQLAlchemy defaults
 '''
 
 
-def setup_db(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+def setup_db(app, database_url=None, sqlite_profile=None):
+    database_url = database_url or DATABASE_URL
+    sqlite_profile = sqlite_profile or SQLITE_PROFILE
+    is_sqlite = make_url(database_url).get_backend_name() == 'sqlite'
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if is_sqlite:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options(
+            sqlite_profile)
     db.app = app
     db.init_app(app)
 
+    if is_sqlite:
+        with app.app_context():
+            set_sqlite_pragmas(db.get_engine(app), sqlite_profile)
+
 
 '''
 db_drop_and_create_all()
@@ -37,7 +129,7 @@ def db_drop_and_create_all():
     # add one demo row which is helping in POSTMAN test
     drink = Drink(
         title='water',
-        recipe='[{"name": "water", "color": "blue", "parts": 1}]'
+        recipe=[{'name': 'water', 'color': 'blue', 'parts': 1}]
     )
 
     drink.insert()
@@ -55,36 +147,52 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients - a native json column, JSONB on postgres
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    # assign a new list to change it; changes made in place are not saved
+    recipe = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        # a single ingredient may be sent without the surrounding list
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        return recipe
 
     '''
     short()
         short form representation of the Drink model
+        built once per loaded instance; see _forget_projections
     '''
 
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                        for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        projection = self.__dict__.get('_short')
+        if projection is None:
+            projection = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': [{'color': r['color'], 'parts': r['parts']}
+                           for r in self.recipe]
+            }
+            self._short = projection
+        return projection
 
     '''
     long()
         long form representation of the Drink model
+        built once per loaded instance; see _forget_projections
     '''
 
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        projection = self.__dict__.get('_long')
+        if projection is None:
+            projection = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': self.recipe
+            }
+            self._long = projection
+        return projection
 
     '''
     insert()
@@ -128,3 +236,186 @@ class Drink(db.Model):
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+'''
+Ingredient
+one line of a drink's recipe, kept in step with Drink.recipe so drinks can
+be searched by ingredient and parts added up in SQL
+name and color are stored lower case; the recipe keeps the original
+neither is length limited, as recipe entries are not
+'''
+
+
+class Ingredient(db.Model):
+    __tablename__ = 'ingredients'
+    __table_args__ = (
+        Index('ingredients_name_color_drink_idx', 'name', 'color', 'drink_id'),
+        Index('ingredients_color_drink_idx', 'color', 'drink_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='CASCADE'),
+                      nullable=False, index=True)
+    name = Column(String, nullable=False)
+    color = Column(String)
+    parts = Column(Float, nullable=False, default=0)
+
+    @staticmethod
+    def rows(drink_id, recipe):
+        return [{
+            'drink_id': drink_id,
+            'name': str(r.get('name', '')).strip().lower(),
+            'color': str(r.get('color', '')).strip().lower() or None,
+            'parts': Ingredient._parts(r.get('parts'))
+        } for r in recipe or [] if isinstance(r, dict)]
+
+    @staticmethod
+    def _parts(parts):
+        try:
+            return float(parts or 0)
+        except (TypeError, ValueError):
+            return 0
+
+
+'''
+Order
+a customer's order for one drink, worked through by the baristas
+status moves queued -> claimed -> ready -> collected, see src/orders.py
+'''
+
+
+class Order(db.Model):
+    __tablename__ = 'orders'
+
+    id = Column(Integer, primary_key=True)
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='SET NULL'))
+    customer = Column(String(80))
+    priority = Column(Integer, nullable=False, default=0)
+    status = Column(String(16), nullable=False, default='queued')
+    # the sub claim of the barista who claimed the order
+    barista = Column(String(120))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = Column(DateTime)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'drink_id': self.drink_id,
+            'customer': self.customer,
+            'priority': self.priority,
+            'status': self.status,
+            'barista': self.barista,
+            'created_at': self.created_at.isoformat() + 'Z',
+            'updated_at': self.updated_at.isoformat() + 'Z'
+        }
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def update(self):
+        db.session.commit()
+
+
+# the barista queue: queued orders by priority, then arrival
+Index('orders_status_priority_id_idx',
+      Order.status, Order.priority.desc(), Order.id)
+
+
+'''
+DrinkEvent
+a committed drink change, written in the same transaction as the change
+every process polls this table for GET /drinks/stream, so a change made
+through one worker reaches the streams and menu snapshots of all of them;
+ids are the stream's event ids, see src/stream.py
+'''
+
+
+class DrinkEvent(db.Model):
+    __tablename__ = 'drink_events'
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String(32), nullable=False)
+    # the drink's short() form, or just its id for a delete
+    drink = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def format(self):
+        return {'type': self.type, 'drink': self.drink}
+
+
+'''
+OrderEvent
+    a committed order change, written in the same transaction as the change
+    every process polls this table for GET /orders/events and computes
+    GET /orders/metrics from it, so both cover the orders handled by every
+    worker; see src/orders.py
+'''
+
+
+class OrderEvent(db.Model):
+    __tablename__ = 'order_events'
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String(32), nullable=False)
+    # the order's format() after the change
+    order = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+    # for order-claimed, the seconds the order waited to be claimed
+    wait = Column(Float)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def format(self):
+        return {'type': self.type, 'order': self.order}
+
+
+'''
+_forget_projections
+    drops the memoized short() and long() forms whenever the title or
+    recipe is assigned or the instance is expired or reloaded
+'''
+
+
+def _forget_projections(target, *args):
+    target.__dict__.pop('_short', None)
+    target.__dict__.pop('_long', None)
+
+
+for _attribute in (Drink.title, Drink.recipe):
+    event.listen(_attribute, 'set', _forget_projections)
+
+for _event in ('expire', 'refresh'):
+    event.listen(Drink, _event, _forget_projections)
+
+
+'''
+Ingredient sync
+    writes a drink's ingredient rows in the same transaction as the drink
+    itself, whenever it is inserted, its recipe changes or it is deleted
+'''
+
+
+def _write_ingredients(connection, drink_id, recipe=None):
+    table = Ingredient.__table__
+    connection.execute(table.delete().where(table.c.drink_id == drink_id))
+    rows = Ingredient.rows(drink_id, recipe)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(Drink, 'after_insert')
+def _drink_inserted(mapper, connection, target):
+    _write_ingredients(connection, target.id, target.recipe)
+
+
+@event.listens_for(Drink, 'after_update')
+def _drink_updated(mapper, connection, target):
+    if inspect(target).attrs.recipe.history.has_changes():
+        _write_ingredients(connection, target.id, target.recipe)
+
+
+@event.listens_for(Drink, 'before_delete')
+def _drink_deleted(mapper, connection, target):
+    _write_ingredients(connection, target.id)
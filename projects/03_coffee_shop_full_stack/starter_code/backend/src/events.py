@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import deque
+
+from .database.models import db
+
+EVENT_BACKLOG = 1000
+EVENT_POLL_INTERVAL = 1.0
+EVENT_POLL_BATCH = 500
+EVENT_PRUNE_INTERVAL = 60
+
+'''
+EventLog
+    a numbered backlog of the last `backlog` events that clients wait on
+    wait(after, timeout) returns the events after the id `after`, blocking
+    up to timeout seconds until there is one
+    ids count up from 1 unless append() is given the id, e.g. a database
+    row id; such ids only have to increase and may skip numbers
+    the wait is a threading.Condition, so under a gevent worker (monkey
+    patched) a waiting client holds a greenlet rather than a thread
+'''
+
+
+class EventLog:
+    def __init__(self, backlog=EVENT_BACKLOG):
+        self.backlog = backlog
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self.last_id = 0
+        # events up to this id are no longer kept
+        self._floor = 0
+
+    def start_at(self, event_id):
+        with self._condition:
+            self._events.clear()
+            self.last_id = self._floor = event_id
+
+    def append(self, event, event_id=None):
+        with self._condition:
+            self.last_id = event_id if event_id is not None \
+                else self.last_id + 1
+            event['id'] = self.last_id
+            if len(self._events) == self._events.maxlen:
+                self._floor = self._events[0]['id']
+            self._events.append(event)
+            self._condition.notify_all()
+
+    def _since(self, after):
+        events = []
+        for event in reversed(self._events):
+            if event['id'] <= after:
+                break
+            events.append(event)
+        events.reverse()
+        return events
+
+    '''
+    covers(after)
+        whether every event after `after` is still in the backlog
+    '''
+
+    def covers(self, after):
+        with self._condition:
+            return self._floor <= after <= self.last_id
+
+    def wait(self, after, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = self._since(after)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events, self.last_id
+                self._condition.wait(remaining)
+
+
+'''
+EventFeed
+    one background thread per process that polls an event table (a model
+    with an integer id and a format() giving the event) every `interval`
+    seconds, or as soon as poll_soon() is called after a commit, and
+    appends new rows to `log`, then calls each of `listeners`
+    the rows are written in the same transaction as the change they
+    describe, so every process sees the changes made through any of them
+    started lazily by start(app) and again after a fork, so it is safe
+    under gunicorn with or without --preload
+    rows beyond the last log.backlog are deleted now and then
+'''
+
+
+class EventFeed:
+    def __init__(self, model, log, interval=EVENT_POLL_INTERVAL,
+                 name='event-feed'):
+        self.model = model
+        self.log = log
+        self.interval = interval
+        self.name = name
+        self.listeners = []
+        self.polls = 0
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pruned = 0
+
+    def start(self, app):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            with app.app_context():
+                self._load()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True,
+                             name=self.name).start()
+
+    def poll_soon(self):
+        self._wake.set()
+
+    def _load(self):
+        model = self.model
+        rows = model.query.order_by(model.id.desc()) \
+            .limit(self.log.backlog).all()
+        db.session.remove()
+        if not rows:
+            self.log.start_at(0)
+            return
+        rows.reverse()
+        self.log.start_at(rows[0].id - 1)
+        for row in rows:
+            self.log.append(row.format(), row.id)
+
+    def poll(self):
+        model = self.model
+        try:
+            rows = model.query \
+                .filter(model.id > self.log.last_id) \
+                .order_by(model.id).limit(EVENT_POLL_BATCH).all()
+            for row in rows:
+                self.log.append(row.format(), row.id)
+
+            now = time.monotonic()
+            if now - self._pruned >= EVENT_PRUNE_INTERVAL:
+                self._pruned = now
+                oldest = self.log.last_id - self.log.backlog
+                model.query \
+                    .filter(model.id <= oldest) \
+                    .delete(synchronize_session=False)
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+        if rows:
+            for listener in self.listeners:
+                listener()
+        self.polls += 1
+        return len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                with self._app.app_context():
+                    self.poll()
+            except Exception as e:
+                print(e)
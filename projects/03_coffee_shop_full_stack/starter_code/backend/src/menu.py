@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .database.models import Drink
+from .stream import drink_feed
+
+'''
+Menu
+    the drink menu serialized once: the response bodies of GET /drinks
+    (short form) and GET /drinks-detail (long form) as JSON bytes, each
+    with an ETag derived from its content
+'''
+
+
+class Menu:
+    def __init__(self, drinks):
+        self.count = len(drinks)
+        self.short = self._body([drink.short() for drink in drinks],
+                                'status_code')
+        self.long = self._body([drink.long() for drink in drinks], 'status')
+        self.short_etag = self._etag(self.short)
+        self.long_etag = self._etag(self.long)
+
+    @staticmethod
+    def _body(drinks, status_key):
+        return json.dumps({
+            status_key: 200,
+            'success': True,
+            'drinks': drinks
+        }, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def _etag(body):
+        return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+'''
+MenuSnapshot
+    keeps the current Menu in memory; a committed drink insert, update or
+    delete, in this process or another, invalidates it and the next read
+    rebuilds it with one query
+'''
+
+
+class MenuSnapshot:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._menu = None
+        self.builds = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._menu = None
+
+    def get(self):
+        menu = self._menu
+        if menu is not None:
+            return menu
+
+        with self._lock:
+            generation = self._generation
+        menu = Menu(Drink.query.order_by(Drink.id).all())
+
+        with self._lock:
+            self.builds += 1
+            # a write committed while building makes this menu stale;
+            # serve it to this request but do not keep it
+            if generation == self._generation:
+                self._menu = menu
+        return menu
+
+
+menu_snapshot = MenuSnapshot()
+
+'''
+menu_response(body, etag, public)
+    serves a menu body straight from memory, or a 304 when the client
+    already has this version
+'''
+
+
+def menu_response(body, etag, public=True):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        'public, no-cache' if public else 'private, no-cache')
+    return response
+
+
+'''
+Invalidation hooks
+    changes are noted on the session while it flushes and only drop the
+    snapshot once the transaction commits
+    changes committed by other processes drop it when the drink feed picks
+    them up, within EVENT_POLL_INTERVAL
+'''
+
+drink_feed.listeners.append(menu_snapshot.invalidate)
+
+
+def _changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['menu_changed'] = True
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Drink, _event, _changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('menu_changed', False):
+        menu_snapshot.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop('menu_changed', None)
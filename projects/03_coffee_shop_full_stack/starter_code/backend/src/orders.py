@@ -0,0 +1,221 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .database.models import db, Order, OrderEvent
+from .events import EventFeed, EventLog
+
+ORDER_WORKERS = 4
+ORDER_EVENT_BACKLOG = 1000
+ORDER_WAIT_TIMEOUT = 25
+ORDER_METRICS_WINDOW = 60
+ORDER_WAIT_SAMPLES = 500
+
+'''
+TRANSITIONS
+    the statuses an order may move to from each status
+    a claimed order can be put back in the queue (released) or cancelled
+'''
+
+TRANSITIONS = {
+    'queued': {'claimed', 'cancelled'},
+    'claimed': {'queued', 'ready', 'cancelled'},
+    'ready': {'collected'},
+    'collected': set(),
+    'cancelled': set()
+}
+
+'''
+order_events
+    the order events that GET /orders/events long-polls, see EventLog
+    each change writes an order_events row in its own transaction, and
+    order_feed polls them into order_events in every process; event ids
+    are row ids, so a client can carry `after` over to any worker
+'''
+
+order_events = EventLog(ORDER_EVENT_BACKLOG)
+order_feed = EventFeed(OrderEvent, order_events, name='order-feed')
+
+
+def _record(kind, order, wait=None):
+    db.session.add(OrderEvent(type='order-' + kind, order=order.format(),
+                              wait=wait))
+
+
+'''
+order_metrics(window)
+    per-minute rates of each kind of order event over the last window
+    seconds and how long the last ORDER_WAIT_SAMPLES claimed orders waited,
+    read from order_events, so they cover every worker
+'''
+
+
+def order_metrics(window=ORDER_METRICS_WINDOW):
+    since = datetime.utcnow() - timedelta(seconds=window)
+    counts = db.session.query(OrderEvent.type, db.func.count(OrderEvent.id)) \
+        .filter(OrderEvent.created_at >= since) \
+        .group_by(OrderEvent.type).all()
+    waits = sorted(wait for wait, in db.session.query(OrderEvent.wait)
+                   .filter(OrderEvent.type == 'order-claimed',
+                           OrderEvent.wait.isnot(None))
+                   .order_by(OrderEvent.id.desc())
+                   .limit(ORDER_WAIT_SAMPLES))
+
+    return {
+        'per_minute': {
+            kind[len('order-'):]: round(count * 60 / window, 1)
+            for kind, count in counts
+        },
+        'claim_wait_seconds': {
+            'avg': round(sum(waits) / len(waits), 3) if waits else None,
+            'p95': round(waits[int(0.95 * (len(waits) - 1))], 3)
+            if waits else None
+        }
+    }
+
+
+'''
+create_order(drink_id, customer)
+    saves a new queued order, which puts it in the barista queue
+'''
+
+
+def create_order(drink_id, customer=None):
+    order = Order(drink_id=drink_id, customer=customer, priority=0,
+                  status='queued')
+    db.session.add(order)
+    db.session.flush()
+    _record('created', order)
+    db.session.commit()
+    order_feed.poll_soon()
+    return order
+
+
+'''
+claim_next_order(barista)
+    claims the highest priority queued order for barista and returns it,
+    or None if nothing is waiting
+    the queue is the orders table itself: each claim reads the top queued
+    row (ORDER BY priority DESC, id, served by orders_status_priority_id_idx)
+    and only succeeds if it flips that row from queued to claimed; a claim
+    that loses the row to another barista, in any process, tries the next
+    the read is committed before the update, so on SQLite the update
+    starts a fresh write transaction and waits its turn for the lock
+'''
+
+
+def claim_next_order(barista):
+    while True:
+        row = db.session.query(Order.id) \
+            .filter(Order.status == 'queued') \
+            .order_by(Order.priority.desc(), Order.id).first()
+        db.session.commit()
+        if row is None:
+            return None
+
+        now = datetime.utcnow()
+        claimed = Order.query \
+            .filter(Order.id == row.id, Order.status == 'queued') \
+            .update({'status': 'claimed', 'barista': barista,
+                     'claimed_at': now, 'updated_at': now},
+                    synchronize_session=False)
+        if not claimed:
+            db.session.rollback()
+            continue
+
+        order = Order.query.populate_existing().get(row.id)
+        wait = (order.claimed_at - order.created_at).total_seconds()
+        _record('claimed', order, wait)
+        db.session.commit()
+        order_feed.poll_soon()
+        return order
+
+
+'''
+apply_order_change(order_id, status, priority)
+    moves an order to status and/or sets its priority; returns the order,
+    or None if the order is gone or another change got to it first
+'''
+
+
+def apply_order_change(order_id, status=None, priority=None):
+    order = Order.query.get(order_id)
+    if order is None:
+        return None
+
+    current = order.status
+    db.session.commit()
+    if status is not None and status not in TRANSITIONS[current]:
+        return None
+
+    values = {'updated_at': datetime.utcnow()}
+    if status is not None:
+        values['status'] = status
+        if status == 'queued':
+            values.update(barista=None, claimed_at=None)
+    if priority is not None:
+        values['priority'] = priority
+
+    changed = Order.query \
+        .filter(Order.id == order_id, Order.status == current) \
+        .update(values, synchronize_session=False)
+    if not changed:
+        db.session.rollback()
+        return None
+
+    order = Order.query.populate_existing().get(order_id)
+    _record(status or 'updated', order)
+    db.session.commit()
+    order_feed.poll_soon()
+    return order
+
+
+'''
+OrderWorker
+    applies status and priority changes on a thread pool, so the PATCH
+    request returns as soon as the change is accepted
+'''
+
+
+class OrderWorker:
+    def __init__(self, workers=ORDER_WORKERS):
+        self.workers = workers
+        self.pending = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, app, order_id, status=None, priority=None):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='order-worker')
+            self.pending += 1
+        return self._executor.submit(
+            self._apply, app, order_id, status, priority)
+
+    def _apply(self, app, order_id, status, priority):
+        try:
+            with app.app_context():
+                order = apply_order_change(order_id, status, priority)
+            if order is None:
+                with self._lock:
+                    self.failed += 1
+            return order
+        except Exception as e:
+            print(e)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'failed': self.failed
+        }
+
+
+order_worker = OrderWorker()
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from flask import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .database.models import Drink, DrinkEvent
+from .events import EventFeed, EventLog
+
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', 100))
+STREAM_HEARTBEAT = 15
+STREAM_RETRY_MS = 5000
+
+'''
+DrinkEvents
+    committed drink changes as drink-created, drink-updated and
+    drink-deleted events carrying the short() form (just the id for a
+    delete), for GET /drinks/stream
+    event ids are drink_events row ids, shared by every process using the
+    database, so a client can resume on any worker
+'''
+
+
+class DrinkEvents(EventLog):
+    def event_id(self, number):
+        return str(number)
+
+    '''
+    cursor(last_event_id)
+        the event number to resume after, or None when the events since
+        last_event_id are no longer available and the client should reload
+        the menu
+        a cursor ahead of this process (another worker saw the event first)
+        resumes from this process's last event; the client may get a few
+        events again, which is harmless as each carries the drink's state
+    '''
+
+    def cursor(self, last_event_id):
+        if not last_event_id:
+            return self.last_id
+
+        if not last_event_id.isdigit():
+            return None
+        number = min(int(last_event_id), self.last_id)
+        if not self.covers(number):
+            return None
+        return number
+
+
+drink_events = DrinkEvents()
+
+'''
+drink_feed
+    polls drink_events rows into drink_events, see EventFeed
+'''
+
+drink_feed = EventFeed(DrinkEvent, drink_events, name='drink-feed')
+
+'''
+StreamClients
+    counts the open streams so they can be capped at STREAM_MAX_CLIENTS
+'''
+
+
+class StreamClients:
+    def __init__(self, limit=STREAM_MAX_CLIENTS):
+        self.limit = limit
+        self.connected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.connected >= self.limit:
+                return False
+            self.connected += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.connected -= 1
+
+
+stream_clients = StreamClients()
+
+
+def _message(event_id, event_type, data):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event_id, event_type, json.dumps(data, separators=(',', ':')))
+
+
+'''
+drink_stream(last_event_id)
+    the body of GET /drinks/stream: replays the events after
+    last_event_id, then sends each new event as it is committed and a
+    comment line every STREAM_HEARTBEAT seconds so proxies keep the
+    connection open and a gone client is noticed
+    the caller must have acquired a slot in stream_clients; it is released
+    when the client disconnects
+'''
+
+
+def drink_stream(last_event_id):
+    after = drink_events.cursor(last_event_id)
+
+    def generate():
+        nonlocal after
+        yield 'retry: {}\n\n'.format(STREAM_RETRY_MS)
+        if after is None:
+            after = drink_events.last_id
+            yield _message(drink_events.event_id(after), 'reset', {})
+
+        while True:
+            events, _ = drink_events.wait(after, STREAM_HEARTBEAT)
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            for change in events:
+                after = change['id']
+                yield _message(drink_events.event_id(change['id']),
+                               change['type'], change['drink'])
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # the server closes the response when the client goes away, even if
+    # the generator never started
+    response.call_on_close(stream_clients.release)
+    return response
+
+
+'''
+Publishing
+    each drink change is written to drink_events on the flushing connection,
+    so it commits or rolls back with the change; a commit that wrote any
+    wakes this process's feed instead of waiting for the next poll
+'''
+
+
+def _record(connection, target, kind, drink):
+    connection.execute(DrinkEvent.__table__.insert(), {
+        'type': 'drink-' + kind,
+        'drink': drink,
+        'created_at': datetime.utcnow()
+    })
+    session = object_session(target)
+    if session is not None:
+        session.info['drink_events'] = True
+
+
+@event.listens_for(Drink, 'after_insert')
+def _drink_created(mapper, connection, target):
+    _record(connection, target, 'created', target.short())
+
+
+@event.listens_for(Drink, 'after_update')
+def _drink_updated(mapper, connection, target):
+    _record(connection, target, 'updated', target.short())
+
+
+@event.listens_for(Drink, 'after_delete')
+def _drink_deleted(mapper, connection, target):
+    _record(connection, target, 'deleted', {'id': target.id})
+
+
+@event.listens_for(Session, 'after_commit')
+def _poll_on_commit(session):
+    if session.info.pop('drink_events', False):
+        drink_feed.poll_soon()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop('drink_events', None)
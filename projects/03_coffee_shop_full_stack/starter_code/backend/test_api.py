@@ -0,0 +1,403 @@
+import os
+import threading
+import time
+
+# an in-memory database, set before src reads DATABASE_URL
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['SQLITE_PROFILE'] = 'default'
+
+import pytest  # noqa: E402
+
+from src.api import app  # noqa: E402
+from src.auth.auth import token_cache  # noqa: E402
+from src.auth.issuer import LocalIssuer  # noqa: E402
+from src.auth.jwks import JWKSKeyStore, JWKSFetchError  # noqa: E402
+from src.auth.token_cache import TokenCache  # noqa: E402
+from src.database.models import db, Drink, Order  # noqa: E402
+from src.events import EventFeed  # noqa: E402
+from src.menu import menu_snapshot  # noqa: E402
+from src.orders import (  # noqa: E402
+    order_events, order_feed, claim_next_order, create_order)
+from src.stream import drink_events, drink_feed  # noqa: E402
+
+'''
+Tests for the coffee shop backend
+    run from the backend directory: python -m pytest -q test_api.py
+    tokens come from a LocalIssuer, so no Auth0 tenant is needed
+    the event feeds are not started; tests poll them explicitly
+'''
+
+issuer = LocalIssuer()
+
+DRINK_PERMISSIONS = ['get:drinks-detail', 'post:drinks', 'patch:drinks',
+                     'delete:drinks']
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+
+
+def auth_headers(permissions=DRINK_PERMISSIONS):
+    return {'Authorization': 'Bearer ' + issuer.mint(permissions)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(EventFeed, 'start', lambda self, app: None)
+    issuer.install()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Drink(title='water', recipe=RECIPE))
+        db.session.add(Drink(title='matcha', recipe=[
+            {'name': 'milk', 'color': 'grey', 'parts': 1},
+            {'name': 'matcha', 'color': 'green', 'parts': 3}]))
+        db.session.commit()
+        drink_events.start_at(0)
+        order_events.start_at(0)
+        menu_snapshot.invalidate()
+
+        yield app.test_client()
+
+        db.session.remove()
+
+
+# Signing keys
+
+class CountingKeySource:
+    def __init__(self, jwks=None):
+        self.jwks = jwks
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        if self.jwks is None:
+            raise IOError('JWKS unavailable')
+        return self.jwks
+
+
+def test_unknown_kid_refetches_the_keys():
+    rotated = LocalIssuer(kid='rotated')
+    source = CountingKeySource(issuer.jwks())
+    store = JWKSKeyStore(source, min_refresh_interval=0)
+
+    assert store.get_key(issuer.kid)['kid'] == issuer.kid
+    source.jwks = {'keys': issuer.jwks()['keys'] + rotated.jwks()['keys']}
+
+    assert store.get_key('rotated')['kid'] == 'rotated'
+    assert source.calls == 2
+
+
+def test_unknown_kids_are_throttled():
+    source = CountingKeySource(issuer.jwks())
+    store = JWKSKeyStore(source, min_refresh_interval=30)
+
+    assert store.get_key(issuer.kid) is not None
+    for kid in ('made-up-1', 'made-up-2', 'made-up-3'):
+        assert store.get_key(kid) is None
+    assert source.calls == 1
+
+
+def test_failed_first_fetch_raises_and_is_throttled():
+    source = CountingKeySource()
+    store = JWKSKeyStore(source, min_refresh_interval=30)
+
+    for _ in range(3):
+        with pytest.raises(JWKSFetchError):
+            store.get_key(issuer.kid)
+    assert source.calls == 1
+    assert store.failures == 1
+
+
+def test_failed_refresh_keeps_the_last_keys():
+    source = CountingKeySource(issuer.jwks())
+    store = JWKSKeyStore(source, min_refresh_interval=0)
+    assert store.get_key(issuer.kid) is not None
+
+    source.jwks = None
+    assert store.get_key('made-up') is None
+    assert store.get_key(issuer.kid)['kid'] == issuer.kid
+    assert store.failures >= 1
+
+
+def test_refresh_ahead_of_the_ttl_runs_in_the_background():
+    source = CountingKeySource(issuer.jwks())
+    store = JWKSKeyStore(source, ttl=0, refresh_ahead=60,
+                         min_refresh_interval=0)
+    assert store.get_key(issuer.kid) is not None
+
+    assert store.get_key(issuer.kid) is not None
+    deadline = time.monotonic() + 5
+    while source.calls < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert source.calls == 2
+
+
+# Verified tokens
+
+def test_token_cache_serves_a_payload_until_it_expires():
+    cache = TokenCache(max_size=8)
+    cache.put('fresh', {'sub': 'a', 'exp': time.time() + 60})
+    cache.put('stale', {'sub': 'b', 'exp': time.time() - 1})
+    cache.put('no-exp', {'sub': 'c'})
+
+    assert cache.get('fresh')['sub'] == 'a'
+    assert cache.get('stale') is None
+    assert cache.get('no-exp') is None
+    assert len(cache) == 1
+
+
+def test_token_cache_evicts_the_least_recently_used():
+    cache = TokenCache(max_size=2)
+    expires = time.time() + 60
+    cache.put('a', {'sub': 'a', 'exp': expires})
+    cache.put('b', {'sub': 'b', 'exp': expires})
+    cache.get('a')
+    cache.put('c', {'sub': 'c', 'exp': expires})
+
+    assert cache.evictions == 1
+    assert cache.get('b') is None
+    assert cache.get('a')['sub'] == 'a'
+    assert cache.get('c')['sub'] == 'c'
+
+
+def test_token_cache_of_size_zero_is_off():
+    cache = TokenCache(max_size=0)
+    cache.put('a', {'sub': 'a', 'exp': time.time() + 60})
+
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_requests_verify_a_token_once(client):
+    headers = auth_headers()
+    for _ in range(3):
+        res = client.get('/drinks-detail', headers=headers)
+        assert res.status_code == 200
+
+    assert token_cache.misses == 1
+    assert token_cache.hits == 2
+
+
+def test_expired_token_is_rejected(client):
+    headers = {'Authorization': 'Bearer ' + issuer.mint(
+        DRINK_PERMISSIONS, ttl=-10)}
+    res = client.get('/drinks-detail', headers=headers)
+
+    assert res.status_code == 401
+
+
+# Batches
+
+def batch(client, operations, atomic=True):
+    return client.post('/drinks/batch', headers=auth_headers(),
+                       json={'operations': operations, 'atomic': atomic})
+
+
+def titles():
+    return sorted(title for title, in db.session.query(Drink.title))
+
+
+def test_batch_reuses_a_title_freed_by_a_rename(client):
+    res = batch(client, [
+        {'op': 'update', 'id': 1, 'title': 'still water'},
+        {'op': 'create', 'title': 'water', 'recipe': RECIPE}
+    ])
+
+    assert res.status_code == 200
+    assert res.get_json()['success']
+    assert titles() == ['matcha', 'still water', 'water']
+
+
+def test_batch_reuses_a_title_freed_by_a_delete(client):
+    res = batch(client, [
+        {'op': 'delete', 'id': 2},
+        {'op': 'create', 'title': 'matcha', 'recipe': RECIPE}
+    ])
+
+    assert res.status_code == 200
+    assert titles() == ['matcha', 'water']
+    assert Drink.query.filter_by(title='matcha').one().recipe == RECIPE
+
+
+def test_batch_rejects_titles_in_use(client):
+    res = batch(client, [
+        {'op': 'create', 'title': 'water', 'recipe': RECIPE},
+        {'op': 'update', 'id': 2, 'title': 'water'},
+        {'op': 'create', 'title': 'latte', 'recipe': RECIPE},
+        {'op': 'create', 'title': 'latte', 'recipe': RECIPE}
+    ], atomic=False)
+
+    body = res.get_json()
+    assert res.status_code == 200
+    assert not body['success']
+    assert [result['success'] for result in body['results']] == \
+        [False, False, True, False]
+    assert {result.get('error') for result in body['results']} == \
+        {'title already in use', None}
+    assert titles() == ['latte', 'matcha', 'water']
+
+
+def test_atomic_batch_applies_nothing_if_any_operation_is_invalid(client):
+    res = batch(client, [
+        {'op': 'create', 'title': 'latte', 'recipe': RECIPE},
+        {'op': 'update', 'id': 1, 'recipe': RECIPE},
+        {'op': 'delete', 'id': 99}
+    ])
+
+    body = res.get_json()
+    assert res.status_code == 422
+    assert body['results'][0] == {'index': 0, 'success': False,
+                                  'skipped': True}
+    assert body['results'][2]['error'] == 'drink not found'
+    assert titles() == ['matcha', 'water']
+
+
+def test_batch_rolls_back_when_applying_fails(client, monkeypatch):
+    def fail(self):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(Drink, 'long', fail)
+
+    res = batch(client, [
+        {'op': 'delete', 'id': 1},
+        {'op': 'create', 'title': 'latte', 'recipe': RECIPE}
+    ])
+
+    assert res.status_code == 422
+    assert titles() == ['matcha', 'water']
+
+
+def test_batch_needs_the_permission_of_every_operation(client):
+    res = client.post('/drinks/batch',
+                      headers=auth_headers(['post:drinks']),
+                      json={'operations': [{'op': 'delete', 'id': 1}]})
+
+    assert res.status_code == 403
+    assert titles() == ['matcha', 'water']
+
+
+# Orders
+
+def test_claims_take_the_highest_priority_first(client):
+    first = create_order(1).id
+    second = create_order(2).id
+    urgent = create_order(1).id
+    Order.query.filter_by(id=urgent).update({'priority': 5})
+    db.session.commit()
+
+    assert [claim_next_order('barista').id for _ in range(3)] == \
+        [urgent, first, second]
+    assert claim_next_order('barista') is None
+
+
+def test_claim_that_loses_the_race_takes_the_next_order(client,
+                                                        monkeypatch):
+    first = create_order(1).id
+    second = create_order(2).id
+    commit = db.session.commit
+    stolen = []
+
+    # another barista claims the order between the read and the update
+    def commit_then_steal():
+        commit()
+        if not stolen:
+            stolen.append(first)
+            with db.engine.begin() as connection:
+                connection.execute(
+                    Order.__table__.update()
+                    .where(Order.id == first)
+                    .values(status='claimed', barista='other'))
+    monkeypatch.setattr(db.session, 'commit', commit_then_steal)
+
+    order = claim_next_order('barista')
+
+    assert order.id == second
+    assert order.barista == 'barista'
+    assert db.session.query(Order.barista).filter_by(id=first).scalar() \
+        == 'other'
+    assert claim_next_order('barista') is None
+
+
+def test_claim_events_reach_the_long_poll(client):
+    headers = auth_headers(['get:orders', 'patch:orders'])
+    order_id = client.post('/orders', json={'drink_id': 1}) \
+        .get_json()['order']['id']
+    res = client.post('/orders/claim', headers=headers)
+    assert res.get_json()['order']['id'] == order_id
+
+    order_feed.poll()
+    body = client.get('/orders/events?after=0&timeout=0',
+                      headers=headers).get_json()
+
+    assert [event['type'] for event in body['events']] == \
+        ['order-created', 'order-claimed']
+    metrics = client.get('/orders/metrics', headers=headers).get_json()
+    assert metrics['orders']['claim_wait_seconds']['avg'] is not None
+
+
+# Drink stream
+
+def read_stream(client, last_event_id, messages):
+    res = client.get('/drinks/stream', buffered=False,
+                     headers={'Last-Event-ID': last_event_id})
+    chunks = []
+    try:
+        body = iter(res.response)
+        while len(chunks) < messages:
+            chunk = next(body)
+            if isinstance(chunk, bytes):
+                chunk = chunk.decode('utf-8')
+            if not chunk.startswith('retry:'):
+                chunks.append(chunk)
+    finally:
+        res.close()
+    return chunks
+
+
+def event_ids(chunks):
+    return [chunk.split('\n')[0][len('id: '):] for chunk in chunks]
+
+
+def test_stream_resumes_after_last_event_id(client):
+    for title in ('latte', 'mocha', 'flat white'):
+        client.post('/drinks', headers=auth_headers(),
+                    json={'title': title, 'recipe': RECIPE})
+    drink_feed.poll()
+    first, second, third = (str(event_id) for event_id in
+                            range(drink_events.last_id - 2,
+                                  drink_events.last_id + 1))
+
+    chunks = read_stream(client, first, 2)
+
+    assert event_ids(chunks) == [second, third]
+    assert all('event: drink-created' in chunk for chunk in chunks)
+    assert 'flat white' in chunks[1]
+
+
+@pytest.mark.parametrize('last_event_id', ['not-a-number', '1'])
+def test_stream_sends_reset_when_it_can_not_resume(client, last_event_id):
+    client.post('/drinks', headers=auth_headers(),
+                json={'title': 'latte', 'recipe': RECIPE})
+    drink_feed.poll()
+    # the backlog no longer holds the events after 1
+    drink_events.start_at(drink_events.last_id + 10)
+
+    chunks = read_stream(client, last_event_id, 1)
+
+    assert chunks[0].startswith(
+        'id: {}\nevent: reset\n'.format(drink_events.last_id))
+
+
+def test_stream_replays_a_change_committed_while_reconnecting(client):
+    drink_feed.poll()
+    last_event_id = str(drink_events.last_id)
+    client.delete('/drinks/2', headers=auth_headers())
+
+    # the change is polled in while the client is waiting
+    def poll():
+        with app.app_context():
+            drink_feed.poll()
+    threading.Timer(0.1, poll).start()
+
+    chunks = read_stream(client, last_event_id, 1)
+
+    assert 'event: drink-deleted' in chunks[0]
+    assert 'data: {"id":2}' in chunks[0]
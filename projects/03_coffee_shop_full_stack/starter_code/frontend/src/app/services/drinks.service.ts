@@ -80,6 +80,10 @@ export class DrinksService {
   //   };
 
 
+  private stream: EventSource = null;
+  // pending /drinks-detail refetch for a burst of stream events
+  private refetch: ReturnType<typeof setTimeout> = null;
+
   constructor(private auth: AuthService, private http: HttpClient) { }
 
   getHeaders() {
@@ -104,7 +108,42 @@ export class DrinksService {
         console.log(res);
       });
     }
+    this.watchDrinks();
+  }
+
+  // keep the menu current from /drinks/stream instead of polling;
+  // EventSource reconnects by itself and resumes from the last event id
+  watchDrinks() {
+    if (this.stream || typeof EventSource === 'undefined') {
+      return;
+    }
+    this.stream = new EventSource(this.url + '/drinks/stream');
+
+    const changed = (event: MessageEvent) => {
+      if (this.auth.can('get:drinks-detail')) {
+        // the stream carries the short form; fetch the full recipes once
+        // per burst of changes rather than once per event
+        this.refetchDrinks();
+      } else {
+        this.drinksToItems([JSON.parse(event.data)]);
+      }
+    };
+    this.stream.addEventListener('drink-created', changed);
+    this.stream.addEventListener('drink-updated', changed);
+    this.stream.addEventListener('drink-deleted', (event: MessageEvent) => {
+      delete this.items[JSON.parse(event.data).id];
+    });
+    this.stream.addEventListener('reset', () => this.getDrinks());
+  }
 
+  refetchDrinks(delay = 1000) {
+    if (this.refetch) {
+      return;
+    }
+    this.refetch = setTimeout(() => {
+      this.refetch = null;
+      this.getDrinks();
+    }, delay);
   }
 
   saveDrink(drink: Drink) {